@@ -0,0 +1,133 @@
+"""
+    file that holds the AfferenceEngine class, used by toponavigator.py to compute
+    the DWAPlanner afference of a robot, that is the interest point reachable with
+    the shortest global plan from the current pose of the robot.
+
+    compared to one make_plan call per interest point on every AMCL pose:
+    + the make_plan service proxy is persistent
+    + the interest points are read from the param server once, into an InterestPoints
+      cache (interest_points.py) that reloads them only when their version changes
+    + the latest afference is reused until the robot moves further than
+      'afference_update_dist' (configured in config.yaml)
+    + make_plan stops within 'ipoint_radius' of the goal, so the euclidean distance
+      minus the radius is a lower bound of the plan length: the interest points are
+      planned in euclidean order and the sweep stops as soon as no remaining
+      interest point can beat the best plan found so far
+    + the euclidean order is drawn lazily from a SpatialIndex (spatial_index.py),
+      a sweep stopped early never looks at the far interest points
+"""
+
+import rospy
+import math
+
+from plan_utils import plan_length
+from interest_points import InterestPoints
+from nav_msgs.srv import GetPlan
+from geometry_msgs.msg import Point
+
+
+class AfferenceEngine(object):
+    def __init__(self, robot_ns, yaml, ipoints=None):
+        """
+        :param (InterestPoints) ipoints: cache of the interest points, a new one if None
+        """
+        self.yaml = yaml
+        self.service = robot_ns + yaml['make_plan']
+        self.update_dist = yaml['afference_update_dist']
+
+        self.ipoints = ipoints if ipoints is not None else InterestPoints(yaml)
+        self.plan_calls = 0  # make_plan calls issued during the latest sweep
+        self.__make_plan = None
+        self.__latest_posit = None
+        self.__latest = None
+
+    def load_ipoints(self):
+        """
+        reloads the interest points if a new version has been published
+        """
+        if self.ipoints.update():
+            self.__latest = None  # computed on the previous interest points
+
+    def get_afference(self, amcl_pose):
+        """
+        :param (PoseStamped) amcl_pose: current pose of the robot
+        :return: (dict) name, position and plan distance of the afference
+        """
+        self.load_ipoints()
+
+        posit = amcl_pose.pose.position
+        if self.__latest is not None and math.hypot(
+            posit.x - self.__latest_posit.x,
+            posit.y - self.__latest_posit.y
+        ) < self.update_dist:
+            self.plan_calls = 0
+            return self.__latest
+
+        # on equal plan length the latest interest point in the param
+        # list wins, as it did with the exhaustive sweep
+        self.plan_calls = 0
+        afference_dist = float('inf')
+        afference = None
+        radius = self.yaml['ipoint_radius']
+        # closest first, latest in the param list first on equal bound
+        for e_dist, index in self.ipoints.index.ordered(posit.x, posit.y):
+            if e_dist - radius > afference_dist:
+                break  # every remaining plan is at least as long as e_dist - radius
+
+            path_length = self.plan_length(amcl_pose, index)
+            if path_length is None:
+                continue
+
+            if(
+                path_length < afference_dist or
+                (path_length == afference_dist and index > afference)
+            ):
+                afference_dist = path_length
+                afference = index
+
+        self.__latest_posit = posit
+        self.__latest = self.build_result(afference, afference_dist)
+
+        return self.__latest
+
+    def plan_length(self, amcl_pose, index):
+        """
+        :param (int) index: index of the interest point
+        :return: (float) length of the plan from amcl_pose to the interest point, None if no plan was found
+        """
+        try:
+            make_plan = self.get_make_plan()
+            response = make_plan(amcl_pose, self.ipoints.posestamp(index), self.yaml['ipoint_radius'])
+            self.plan_calls += 1
+        except rospy.ServiceException as e:
+            print "Make_plan call failed: %s" % e
+            self.close()  # the persistent connection gets re-opened on the next call
+            return None
+
+        if not response.plan.poses:  # navfn returns an empty plan when the goal is unreachable
+            return None
+
+        return plan_length(response.plan)
+
+    def get_make_plan(self):
+        if self.__make_plan is None:
+            rospy.wait_for_service(self.service)
+            self.__make_plan = rospy.ServiceProxy(self.service, GetPlan, persistent=True)
+
+        return self.__make_plan
+
+    def build_result(self, index, dist):
+        if index is None:
+            return {'afference': None, 'ip_posit': None, 'dist': dist}
+
+        x, y = self.ipoints.index.coords[index]
+        return {
+            'afference': self.ipoints.names[index],
+            'ip_posit': Point(x, y, 0),
+            'dist': dist
+        }
+
+    def close(self):
+        if self.__make_plan is not None:
+            self.__make_plan.close()
+            self.__make_plan = None
@@ -25,6 +25,9 @@ from multirobot_interference.msg import AfferenceDebug
 from visualization_msgs.msg import Marker, MarkerArray
 from std_msgs.msg import Header, ColorRGBA
 from geometry_msgs.msg import Pose, Quaternion, Vector3
+from publishers import PublisherRegistry
+
+publishers = PublisherRegistry()
 
 
 def build_marker(start, goal, color):
@@ -71,15 +74,14 @@ def on_afference(msg):
     
 
 def publish(msg, topic):
-    pub = rospy.Publisher(topic, Marker, queue_size=10)
-    while pub.get_num_connections() < 1:
-        rospy.sleep(0.1)
-    pub.publish(msg)
+    publishers.publish(topic, msg)
 
 
 if __name__ == '__main__':
     rospy.init_node('afference_debugger')
     
+    publishers.register('/eucl_aff', Marker)
+    publishers.register('/mvbs_aff', Marker)
     rospy.Subscriber('/afference_debug', AfferenceDebug, on_afference)
     
     rospy.spin()
@@ -0,0 +1,85 @@
+"""
+    joint assignment of destinations to robots, used by topoplanner.py in 'batched' dispatch mode.
+
+    given a (robots x destinations) utility matrix, finds the assignment that maximizes
+    the total utility. scipy's Hungarian solver is used when available, otherwise an
+    auction algorithm (Bertsekas) written with numpy.
+    entries set to -inf are forbidden pairs.
+"""
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+def assign(utility):
+    """
+    :param utility: (np.ndarray) utility[r, d] of sending robot r to destination d
+    :return: (list) (robot index, destination index) pairs, robots left out aren't listed
+    """
+    utility = np.asarray(utility, dtype=float)
+    if utility.size == 0:
+        return []
+
+    # every robot also gets a private "stay unassigned" column, worse than any allowed pair
+    allowed = np.isfinite(utility)
+    if not allowed.any():
+        return []
+    floor = utility[allowed].min() - 1.0 - np.ptp(utility[allowed])
+    robots = utility.shape[0]
+    dummies = np.full((robots, robots), -np.inf)
+    np.fill_diagonal(dummies, floor)
+    benefit = np.hstack((utility, dummies))
+
+    if linear_sum_assignment is not None:
+        cost = -np.where(np.isfinite(benefit), benefit, floor - 1.0)
+        rows, cols = linear_sum_assignment(cost)
+        pairs = zip(rows, cols)
+    else:
+        pairs = enumerate(auction(benefit))
+
+    return [
+        (int(r), int(d)) for r, d in pairs
+        if d < utility.shape[1] and allowed[r, d]
+    ]
+
+
+def auction(benefit, eps=None):
+    """
+    forward auction for a (persons x objects) benefit matrix with persons <= objects,
+    where every person has at least one allowed object.
+    the result is within persons * eps of the optimum
+
+    :return: (np.ndarray) object assigned to each person
+    """
+    persons, objects = benefit.shape
+    if eps is None:
+        eps = 1e-3 / persons
+
+    prices = np.zeros(objects)
+    owner = np.full(objects, -1, dtype=int)
+    assigned = np.full(persons, -1, dtype=int)
+
+    unassigned = list(range(persons - 1, -1, -1))
+    while unassigned:
+        person = unassigned.pop()
+        values = benefit[person] - prices
+
+        best = int(np.argmax(values))
+        best_value = values[best]
+        values[best] = -np.inf
+        second_value = values.max()
+        if not np.isfinite(second_value):  # a single allowed object, any price would do
+            second_value = best_value
+
+        prices[best] += best_value - second_value + eps
+        if owner[best] >= 0:
+            assigned[owner[best]] = -1
+            unassigned.append(owner[best])
+        owner[best] = person
+        assigned[person] = best
+
+    return assigned
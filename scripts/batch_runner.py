@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+"""
+    runs a sweep of simulations back to back, NOT A NODE: run it as a plain script, for example
+        ./batch_runner.py --spec ../param/sweep.yaml
+
+    the sweep spec (see param/sweep.yaml) lists environments, robot numbers, repetitions and
+    afference modes, every combination is a trial:
+    + a trial is a headless start.launch (no Gazebo GUI, no RViz) with its own config yaml,
+      a copy of param/config.yaml with the overrides of the trial and 'simulation_dump' set
+    + 'workers' trials run in parallel, each on its own ROS master and Gazebo master port
+    + the dumps land in the usual "idleness/$(env)/dumps/$(robotnum)/" layout, tagged with the trial
+      and the id of the sweep run: the files of other sweeps are never taken for the trial's own
+    + completed trials are appended to a journal, a sweep run again skips them
+"""
+
+import argparse
+import glob
+import json
+import os
+import signal
+import subprocess
+import tempfile
+import time
+import uuid
+import yaml
+
+from Queue import Queue
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+
+import idleness_dump
+
+
+PKG_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_CONFIG = os.path.join(PKG_PATH, 'param/config.yaml')
+IDLENESS_PATH = os.path.join(PKG_PATH, 'idleness/')
+
+ROS_BASE_PORT = 11311
+GAZEBO_BASE_PORT = 11345
+
+
+class Trial(object):
+    def __init__(self, environment, robots, repetition, afference_mode, run_id=''):
+        """
+        :param (str) run_id: id of the sweep run, part of the tag of the dumps
+        """
+        self.environment = environment
+        self.robots = robots
+        self.repetition = repetition
+        self.afference_mode = afference_mode
+        self.run_id = run_id
+
+    @property
+    def key(self):
+        return "%s/%s/%s/%s" % (self.environment, self.robots, self.afference_mode, self.repetition)
+
+    @property
+    def tag(self):
+        tag = "%s%s" % (self.afference_mode, self.repetition)
+        if self.run_id:
+            tag += "-%s" % self.run_id
+        return tag
+
+    def __repr__(self):
+        return self.key
+
+
+class BatchRunner(object):
+    def __init__(self, spec, config=DEFAULT_CONFIG, journal=None, idleness_path=IDLENESS_PATH):
+        self.spec = spec
+        self.idleness_path = idleness_path
+        self.journal = journal
+        self.lock = Lock()  # guards the journal and the processes
+        self.processes = set()  # roslaunch of the running trials
+        self.interrupted = False
+        self.run_id = "%s%s" % (time.strftime("%y%m%d%H%M%S", time.localtime()), uuid.uuid4().hex[:4])
+
+        with open(config, 'r') as f:
+            self.config = yaml.safe_load(f)
+        self.workdir = tempfile.mkdtemp(prefix='batch_runner_')
+
+        # free ports, one pair per worker
+        self.slots = Queue()
+        for i in range(spec.get('workers', 1)):
+            self.slots.put(i + 1)
+
+    def trials(self):
+        modes = self.spec.get('afference_mode', self.config['afference_mode'])
+        if not isinstance(modes, list):
+            modes = [modes]
+
+        trials = []
+        for env in self.spec['environments']:
+            for robots in self.spec['robots']:
+                for mode in modes:
+                    for rep in range(self.spec.get('repetitions', 1)):
+                        trials.append(Trial(env, robots, rep, mode, run_id=self.run_id))
+        return trials
+
+    def completed(self):
+        """
+        :return: (set) keys of the trials in the journal
+        """
+        try:
+            with open(self.journal, 'r') as f:
+                return set(json.loads(line)['trial'] for line in f if line.strip())
+        except IOError:
+            return set()
+
+    def run(self):
+        done = self.completed()
+        trials = [t for t in self.trials() if t.key not in done]
+        print "%s trials to run, %s already completed" % (len(trials), len(done))
+
+        pool = ThreadPool(self.spec.get('workers', 1))
+        results = pool.imap_unordered(self.run_trial, trials)
+        try:
+            for _ in trials:
+                while True:
+                    try:
+                        trial, ok = results.next(timeout=1)  # a timeout keeps the wait interruptible
+                        break
+                    except TimeoutError:
+                        pass
+                print "%s %s" % (trial, 'done' if ok else 'FAILED')
+        except KeyboardInterrupt:
+            self.interrupted = True
+            with self.lock:
+                processes = list(self.processes)
+            for process in processes:
+                self.stop(process)
+            pool.terminate()
+            raise
+
+        pool.close()
+        pool.join()
+
+    def run_trial(self, trial):
+        slot = self.slots.get()
+        try:
+            ok = self.launch(trial, slot)
+            if ok:
+                with self.lock:
+                    with open(self.journal, 'a') as f:
+                        f.write(json.dumps({'trial': trial.key, 'tag': trial.tag, 'time': time.time()}) + '\n')
+            return trial, ok
+        finally:
+            self.slots.put(slot)
+
+    def launch(self, trial, slot):
+        """
+        :return: (bool) True if the trial has been dumped
+        """
+        config = dict(self.config)
+        config.update(self.spec.get('config', {}))
+        config.update({
+            'afference_mode': trial.afference_mode,
+            'simulation_dump': True,
+            'simulation_confirm_gui': False,
+            'dump_tag': trial.tag,
+        })
+        config_file = os.path.join(self.workdir, trial.key.replace('/', '_') + '.yaml')
+        with open(config_file, 'w') as f:
+            yaml.safe_dump(config, f, default_flow_style=False)
+
+        for subdir in ('%s/%s/' % (trial.environment, trial.robots),
+                       '%s/dumps/%s/' % (trial.environment, trial.robots)):
+            if not os.path.exists(self.idleness_path + subdir):
+                os.makedirs(self.idleness_path + subdir)
+
+        ros_port = ROS_BASE_PORT + slot
+        env = dict(os.environ)
+        env['ROS_MASTER_URI'] = 'http://localhost:%s' % ros_port
+        env['GAZEBO_MASTER_URI'] = 'http://localhost:%s' % (GAZEBO_BASE_PORT + slot)
+
+        cmd = [
+            'roslaunch', '-p', str(ros_port), 'multirobot_interference', 'start.launch',
+            'environment:=%s' % trial.environment, 'robots_num:=%s' % trial.robots,
+            'config_yaml:=%s' % config_file,
+            'gazebo_gui:=false', 'rviz:=false', 'gz_killer:=false', 'planner_logs:=false',
+        ]
+        log = open(os.path.join(self.workdir, trial.key.replace('/', '_') + '.log'), 'w')
+        process = subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                   preexec_fn=os.setsid)  # own process group, gzserver included
+        with self.lock:
+            self.processes.add(process)
+
+        if config['simulation_time_measure'] == 'minutes':
+            timeout = 60 * config['simulation_duration']
+        else:
+            timeout = config['simulation_duration']
+        timeout += self.spec.get('startup_timeout', 120) + config['dump_deadline']
+
+        deadline = time.time() + timeout
+        while process.poll() is None and time.time() < deadline:
+            time.sleep(1)
+        finished = process.poll() is not None and not self.interrupted
+        self.stop(process)
+        log.close()
+        with self.lock:
+            self.processes.discard(process)
+
+        if not finished:  # stopped halfway, the files dumped on shutdown hold a partial run
+            self.discard(trial)
+            return False
+        if not self.dumped(trial):  # run again on resume, with its own files
+            self.discard(trial)
+            return False
+        return True
+
+    def dumped(self, trial):
+        """
+        :return: (bool) True if the trial wrote a dump and every dump of the trial loads
+        """
+        dumps = self.files(trial, '_DUMP.npz')
+        for dump in dumps:
+            try:
+                idleness_dump.read_run(dump)
+            except Exception as e:  # truncated or corrupted, np.load raises several types
+                print "%s: %s unreadable, %s" % (trial, dump, e)
+                return False
+        return len(dumps) > 0
+
+    def files(self, trial, suffix):
+        """
+        :return: (list) files of the trial ending with suffix, the tag holds the run id so only this run wrote them
+        """
+        return glob.glob('%s%s/dumps/%s/*-%s%s' % (self.idleness_path, trial.environment, trial.robots, trial.tag, suffix)) + \
+            glob.glob('%s%s/%s/*-%s%s' % (self.idleness_path, trial.environment, trial.robots, trial.tag, suffix))
+
+    def discard(self, trial):
+        for suffix in ('.txt', '_DUMP.npz', '_STREAM.bin', '_STREAM.json',
+                       '.txt' + idleness_dump.PARTIAL_SUFFIX, '_DUMP.npz' + idleness_dump.PARTIAL_SUFFIX):
+            for f in self.files(trial, suffix):
+                os.remove(f)
+
+    @staticmethod
+    def stop(process, grace=20):
+        """
+        SIGINT to the whole process group of the trial, SIGKILL if it doesn't exit within grace seconds
+        """
+        for sig in (signal.SIGINT, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except OSError:
+                return  # already gone
+
+            deadline = time.time() + grace
+            while process.poll() is None and time.time() < deadline:
+                time.sleep(0.5)
+            if process.poll() is not None:
+                return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spec', type=str, required=True, help='Sweep spec yaml')
+    parser.add_argument('--yaml', type=str, default=DEFAULT_CONFIG, help='Base config of the trials')
+    parser.add_argument('--journal', type=str, help='Completed trials, $(spec).journal if not set')
+    args, unknown = parser.parse_known_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with open(args.spec, 'r') as f:
+        spec = yaml.safe_load(f)
+
+    runner = BatchRunner(spec, config=args.yaml, journal=args.journal or args.spec + '.journal')
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        print "Interrupted, run the same command to resume"
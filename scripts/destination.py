@@ -5,12 +5,43 @@
 
 import rospy
 
+from collections import deque
+
+_clock = rospy.Time.now  # source of the current time of the Destinations
+_sink = None  # receives every observation as soon as it is registered
+
+
+def set_clock(clock):
+    """
+    replaces rospy.Time.now as source of time of the Destinations,
+    e.g. with the simulated time of patrol_simulator.py
+
+    :param clock: callable returning the current time as rospy.Time
+    """
+    global _clock
+    _clock = clock
+
+
+def now():
+    return _clock()
+
+
+def set_sink(sink):
+    """
+    streams the observations of every Destination to sink, e.g. an ObservationSink
+
+    :param sink: object with an append(name, observation) method, None to stop streaming
+    """
+    global _sink
+    _sink = sink
+
 
 class Idleness(object):
-    def __init__(self, true, remaining, estim):
+    def __init__(self, true, remaining, estim, first=False):
         self.__true_idl = true
         self.__estim_idl = estim
         self.__remaining_idl = remaining
+        self.__first = first
     
     def get_true(self):
         return self.__true_idl
@@ -31,10 +62,9 @@ class Idleness(object):
     def is_first(self):
         """
         and idleness is considered "first" if it portraits that the
-        Destination never got visited, hence the idleness is max
+        Destination never got visited, hence the idleness spans the whole simulation
         """
-        # TODO: use variable to scale properly if one decides to change the duration of the sim
-        return self.__true_idl >= 60.00
+        return self.__first
     
     def get_estimate_index(self, _type=float):
         """
@@ -54,7 +84,11 @@ class Idleness(object):
     
 
 class Observation(object):
-    def __init__(self, idleness, path_len):
+    stamp = None  # observations unpickled from the old dumps have no stamp
+    start = None
+    path_estimated = False
+    
+    def __init__(self, idleness, path_len, stamp=None, start=None, path_estimated=False):
         if not isinstance(idleness, Idleness):
             raise TypeError("Observation could not be created: %s not of type Idleness" % idleness)
         if not isinstance(path_len, float):
@@ -65,6 +99,9 @@ class Observation(object):
         
         self.idleness = idleness
         self.path_len = path_len
+        self.stamp = stamp  # (float) seconds of the clock when the observation has been registered
+        self.start = start  # (float) seconds of the clock when the simulation started
+        self.path_estimated = path_estimated  # (bool) path_len is the euclidean distance, not a plan length
         
     def get_interference(self):
         interf = self.idleness.get_remaining() - self.idleness.get_estimated()
@@ -82,16 +119,23 @@ class Observation(object):
 
 
 class Destination(object):
-    def __init__(self, name, pose, available=True):
+    def __init__(self, name, pose, available=True, history=None):
+        """
+        :param (int) history: observations kept in memory, all of them if None.
+            the older ones are only available through the sink, see set_sink
+        """
         self.name = name
         self.pose = pose
         self.estim_idl = 0
-        self.__latest_usage = rospy.Time.now()
-        self.__remaining_idl = rospy.Time.now()
-        self.__stats = []  # stores every idleness registered
+        self.__latest_usage = now()
+        self.__remaining_idl = now()
+        self.__stats = deque(maxlen=history)  # stores the latest idlenesses registered
         self.__available = available
+        self.__start = now()  # start of the simulation, the Destinations are created with it
+        self.__visited = False  # False until the first idleness is registered
         
         self.path_len = 0.0  # path len from robot pos to this dest
+        self.path_estimated = False  # path_len is the euclidean distance, not planned yet
         
     @property
     def available(self):
@@ -111,56 +155,79 @@ class Destination(object):
             latest_available is True and
             self.__available is False
         ):  # destination has been chosen, set ac_idleness
-            self.__remaining_idl = rospy.Time.now()
+            self.__remaining_idl = now()
+        
+    def get_latest_usage(self):
+        """
+        :return: (rospy.Time) time of the latest visit
+        """
+        return self.__latest_usage
         
     def get_true_idleness(self):
         """
         :return: seconds elapsed since latest usage (type: float)
         """
-        now = rospy.Time.now()
-        return (now - self.__latest_usage).to_sec()
+        return (now() - self.__latest_usage).to_sec()
         
-    def __append_idleness(self):
+    def __append_idleness(self, shutdown=False):
         true_idl = self.get_true_idleness()
         
         if true_idl >= 0:
-            self.__stats.append(
-                Observation(
-                    Idleness(
-                        true=true_idl,
-                        estim=self.estim_idl,
-                        remaining=(rospy.Time.now() - self.__remaining_idl).to_sec()
-                    ),
-                    self.path_len
-                )
+            observation = Observation(
+                Idleness(
+                    true=true_idl,
+                    estim=self.estim_idl,
+                    remaining=(now() - self.__remaining_idl).to_sec(),
+                    first=shutdown and not self.__visited  # from the start to the end of the simulation
+                ),
+                self.path_len,
+                stamp=now().to_sec(),
+                start=self.__start.to_sec(),
+                path_estimated=self.path_estimated
             )
+            self.__visited = True
+            self.__stats.append(observation)
+            if _sink is not None:
+                _sink.append(self.name, observation)
         
     def get_stats(self):
-        return self.__stats
+        return list(self.__stats)
     
     def get_visits(self):
         """
         a visit is an observation that
             1) is not the first and only one
             2) is not null
+            3) has a planned path length, not the euclidean estimate
         
         :return: (list) visits
         """
         visits = []
         for observ in self.__stats:
-            if not observ.is_null() and not observ.is_first():
+            if not observ.is_null() and not observ.is_first() and not observ.path_estimated:
                 visits.append(observ)
                 
         return visits
         
+    def release(self):
+        """
+        frees a destination whose robot gave up on it: it has not been visited,
+        hence no idleness is registered and its latest usage is kept
+        """
+        self.__available = True
+        self.estim_idl = 0
+        self.path_len = 0.0
+        self.path_estimated = False
+        
     def reset(self):
         self.estim_idl = 0
         self.path_len = 0.0
-        self.__latest_usage = rospy.Time.now()
-        self.__remaining_idl = rospy.Time.now()
+        self.path_estimated = False
+        self.__latest_usage = now()
+        self.__remaining_idl = now()
         
     def force_shutdown(self):
-        self.__append_idleness()
+        self.__append_idleness(shutdown=True)
         self.reset()
         
     def __str__(self):
@@ -38,6 +38,7 @@ SMALLER = {
 class DestDebugger(object):
     def __init__(self, yaml, dest_count):
         self.yaml = yaml
+        self.dest_table = {}  # widget name -> (available, idleness, stamp of the msg that listed it)
         
         self.root = Tk()
         self.root.title("Destinations debugger")
@@ -136,21 +137,31 @@ class DestDebugger(object):
         self.root.mainloop()
     
     def listen_destinations(self):
-        self.dest_sub = rospy.Subscriber(self.yaml['destinations_log'], DestinationDebug, self.on_destination)
+        self.dest_sub = rospy.Subscriber(self.yaml['destinations_log'], DestinationDebugArray, self.on_destination)
     
     def on_destination(self, msg):
-        name = str(msg.name).lower()
-        frame = self.root.nametowidget(name)
+        """
+        applies the whole destinations table in a single UI update.
+        a delta msg lists only the changed destinations, the idleness
+        of the others is advanced to the stamp of the msg
+        """
+        for dest in msg.destinations:
+            self.dest_table[str(dest.name).lower()] = (dest.available, dest.idleness, msg.header.stamp)
         
-        idleness = round(float(msg.idleness), 3)
-        wp_idl = frame.nametowidget('idl_'+name)
-        wp_idl.delete(0, 'end')
-        wp_idl.insert(0, str(idleness))
+        for name, (available, idleness, stamp) in self.dest_table.items():
+            frame = self.root.nametowidget(name)
+            
+            idleness = round(float(idleness) + (msg.header.stamp - stamp).to_sec(), 3)
+            wp_idl = frame.nametowidget('idl_'+name)
+            wp_idl.delete(0, 'end')
+            wp_idl.insert(0, str(idleness))
+            
+            if available:
+                frame['bg'] = 'green'
+            else:
+                frame['bg'] = 'red'
         
-        if msg.available:
-            frame['bg'] = 'green'
-        else:
-            frame['bg'] = 'red'
+        self.root.update_idletasks()
             
     def robot_states(self):
         rospy.Subscriber('/robot_1'+self.yaml['robot_state'], RobotState, self.on_state)
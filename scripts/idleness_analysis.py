@@ -4,40 +4,48 @@
     this file holds the serializer and deserializer of the idlenesses of the Destinations.
     IdlenessLogger:
         serializer, called during the shutdown of topoplanner.py
-        + pickles the Destinations in the appropriate "idleness/$(env)/dumps/$(robotnum)/" subfolder
+        + dumps the observations of the Destinations (idleness_dump.py) in the appropriate "idleness/$(env)/dumps/$(robotnum)/" subfolder
+        + optionally streams them there while the run is in progress (observation_sink.py)
         + prints a PrettyTable in the appropriate "idleness/$(env)/$(robotnum)/" subfolder
+        + headless unless show_confirm_gui() is called: Tk and matplotlib are imported only when used
         
     IdlenessAnalizer:
         deserializer, called when running this file alone (NOT AS NODE)
-        + unpickles the Destinations
-        + analyzes the Destinations
-        + shows a graphical result
+        + loads the dumped observations, old pickled dumps and runs in progress included, in a process pool
+        + caches the summary of every run in "$(maindir)/.summaries.json", keyed by dump and mtime
+        + analyzes the observations, with bootstrap confidence intervals and the runs each cell still needs
+        + rebuilds the idleness over time of every run, for its time-averaged and worst-case idleness
+        + shows a graphical result, or saves the figures to files (idleness_figures.py)
 """
 
 import rospy
 import os
+import argparse
+import json
 import numpy as np
-import matplotlib.pyplot as plt
-import tkMessageBox
 import time
 import subprocess
-import pickle
-import tkFont
 from pprint import pprint
+from multiprocessing import Pool
+from threading import Thread
 
-from destination import Destination
+import idleness_dump
+import idleness_figures
+import idleness_stats
+import idleness_timeseries
+from destination import Destination, now, set_sink
+from observation_sink import ObservationSink
 from prettytable import PrettyTable
-try:
-    import tkinter as tk
-except ImportError:
-    import Tkinter as tk
 
 
 DEFAULT_PATH = (os.path.dirname(os.path.realpath(__file__))).replace('scripts', 'idleness/')
+CACHE_FILE = '.summaries.json'  # per-run summaries, in maindir
+CACHE_VERSION = 6  # to be bumped whenever summarize_run changes
+BOOTSTRAP_SEED = 0  # the same dumps give the same intervals, and the same figures
 
 
 class IdlenessLogger(object):
-    def __init__(self, dest_list, environment, robots_num, path=DEFAULT_PATH):
+    def __init__(self, dest_list, environment, robots_num, path=DEFAULT_PATH, tag=None):
         if all(isinstance(d, Destination) for d in dest_list):
             self.dest_list = dest_list
         else:
@@ -45,9 +53,42 @@ class IdlenessLogger(object):
         self.path = path
         self.environment = environment  # office, house ...
         self.robots_num = robots_num
-        self.tk_root = tk.Tk()
+        self.tag = tag  # appended to the file names, tells apart runs started in the same minute
+        self.datetime = time.strftime("%d-%m@%H_%M", time.localtime())
+        self.sink = None  # streams the observations while the run is in progress, see open_stream
+        self.tk_root = None
+    
+    def basename(self):
+        """
+        :return: (str) name shared by the files of the run, without extension
+        """
+        name = "%s-%s-%sbots" % (self.datetime, self.environment, self.robots_num)
+        if self.tag:
+            name += "-%s" % self.tag
+        return name
+    
+    def open_stream(self, flush_rows=32, fsync_period=10.0):
+        """
+        streams every observation of the Destinations to "$(env)/dumps/$(robotnum)/*_STREAM.bin" from now on,
+        the stream is replaced by the dump when write_statfile() is called
+        """
+        dumpdir = "%s%s/dumps/%s/" % (self.path, self.environment, self.robots_num)
+        self.sink = ObservationSink(
+            dumpdir + self.basename(), names=[d.name for d in sorted(self.dest_list, key=lambda dest: dest.name)],
+            environment=self.environment, robots=self.robots_num, start=now().to_sec(),
+            flush_rows=flush_rows, fsync_period=fsync_period
+        )
+        set_sink(self.sink)
     
     def show_confirm_gui(self):
+        # Tk is imported here, the headless dump has to work without a display
+        import tkFont
+        try:
+            import tkinter as tk
+        except ImportError:
+            import Tkinter as tk
+        
+        self.tk_root = tk.Tk()
         self.tk_root.title("Dump destinations")
         self.tk_root.geometry("320x200")
         self.tk_root.eval('tk::PlaceWindow %s center' % self.tk_root.winfo_toplevel())
@@ -66,15 +107,47 @@ class IdlenessLogger(object):
         button = tk.Button(frame, text="OK", command=lambda: self.write_statfile())
         button.pack(side="left", fill="none", expand=True, padx=5, pady=5)
         
-        button = tk.Button(frame, text="Cancel", command=lambda: self.tk_root.destroy())
+        button = tk.Button(frame, text="Cancel", command=lambda: self.discard())
         button.pack(side="right", fill="none", expand=True, padx=5, pady=5)
         
         self.tk_root.mainloop()
     
+    def write_in_background(self, deadline):
+        """
+        headless dump: write_statfile() runs in a background thread, waited for at most deadline seconds
+        
+        :param (float) deadline: seconds the caller can wait for the files
+        :return: (bool) True if the files have been written within deadline
+        """
+        writer = Thread(target=self.write_statfile, name='idleness_writer')
+        writer.daemon = True  # doesn't keep a shutting down node alive past the deadline
+        writer.start()
+        writer.join(deadline)
+        
+        if writer.is_alive():
+            rospy.logwarn('Destination idlenesses not written within %ss' % deadline)
+            return False
+        return True
+    
+    def discard(self):
+        """
+        drops the run, the stream included
+        """
+        if self.sink is not None:
+            set_sink(None)
+            self.sink.remove()
+        if self.tk_root is not None:
+            self.tk_root.destroy()
+    
     def write_statfile(self):
-        datetime = time.strftime("%d-%m@%H_%M", time.localtime())
         subdir = "%s/%s/" % (self.environment, self.robots_num)
-        filename = "%s-%s-%sbots.txt" % (datetime, self.environment, self.robots_num)
+        filename = self.basename() + ".txt"
+        
+        # the shutdown observations go to the dump too: the ones of the destinations never visited
+        # are flagged first_visit
+        dests = sorted(self.dest_list, key=lambda dest: dest.name)
+        for d in dests:
+            d.force_shutdown()
         
         self.write_dumpfile(filename=filename, env=self.environment, robots=str(self.robots_num))
         
@@ -82,126 +155,226 @@ class IdlenessLogger(object):
         pt = PrettyTable()
         pt.field_names = ['Dest name', 'true', 'remaining', 'estimated', 'path_len', 'mean', 'max', 'min']
         
-        total_visits = 0
-        means = []
-        for d in sorted(self.dest_list, key=lambda dest: dest.name):
-            d.force_shutdown()
-            
-            observations = d.get_stats()
-            true_idls = [o.idleness.get_true() for o in observations]
-            
-            # try:
-            # if len(idlenesses) > 0:
-            mean = round(np.mean(true_idls), 3)
-            min = round(np.min(true_idls), 3)
-            max = round(np.max(true_idls), 3)
-        
-            means.append(mean)
-            total_visits += len(d.get_visits())
+        if self.sink is not None:  # the Destinations only hold their latest observations
+            self.sink.close()
+            set_sink(None)
+            table = idleness_dump.read_stream(self.sink.filename)
+        else:
+            table = idleness_dump.from_destinations(dests, environment=self.environment, robots=self.robots_num)
+        stats = idleness_stats.destination_stats(table, percentiles=())
+        total_visits = int(stats['visits'].sum())
+        estimated_visits = int(stats['estimated visits'].sum())
+        means = [round(m, 3) for m in stats['mean']]
+        
+        ids, starts, ends = idleness_stats.group_bounds(table.dest)
+        for k in range(len(ids)):
+            mean = means[k]
+            min = round(stats['min'][k], 3)
+            max = round(stats['max'][k], 3)
             
-            for i in range(len(observations)):
-                idl = observations[i].idleness
+            rows = zip(*[getattr(table, c)[starts[k]:ends[k]].tolist()
+                         for c in ('true', 'remaining', 'estimated', 'path_len', 'path_estimated')])
+            for i in range(len(rows)):
+                true, remaining, estimated, path_len, path_estimated = rows[i]
+                if path_estimated:  # euclidean distance, the plan length wasn't known yet
+                    estimated, path_len = '~%s' % estimated, '~%s' % path_len
                 if i == 0:
-                    pt.add_row([
-                        d.name, idl.get_true(),
-                        idl.get_remaining(), idl.get_estimated(), observations[i].path_len, mean, max, min
-                    ])
+                    pt.add_row([table.names[ids[k]], true, remaining, estimated, path_len, mean, max, min])
                 else:
-                    pt.add_row([
-                        '', idl.get_true(),
-                        idl.get_remaining(), idl.get_estimated(),observations[i].path_len, '', '', ''
-                    ])
-            # else:
-            #     rospy.logerr("%s idlenesses empty" % d.name)
-            # except ValueError:
-            #     rospy.logwarn("Something wrong while calculating idlenesses stats")
-            #     print true_idls
+                    pt.add_row(['', true, remaining, estimated, path_len, '', '', ''])
         
         separator = "-----------\n"
         lines.append(pt.__str__())
         lines.append("\nAverage idleness: %s\n" % round(np.mean(means), 3))
         lines.append(separator + "Variance idleness: %s\n" % round(np.var(means), 3))
         lines.append(separator + "Total visits: %s\n" % total_visits)
+        lines.append(separator + "Visits left out, euclidean path length (~): %s\n" % estimated_visits)
+        
+        # renamed once complete, as the dump: a deadline overrun leaves no truncated statfile
+        statfile = self.path + subdir + filename
+        with open(statfile + idleness_dump.PARTIAL_SUFFIX, 'w') as f:
+            f.writelines(lines)
+        os.rename(statfile + idleness_dump.PARTIAL_SUFFIX, statfile)
         
-        file = open(self.path + subdir + filename, 'w')
-        file.writelines(lines)
+        if self.sink is not None:
+            self.sink.remove()  # dumped
         
         rospy.loginfo('Destination idlenesses have been wrote to %s' % self.path)
-        self.tk_root.destroy()
+        if self.tk_root is not None:
+            self.tk_root.destroy()
     
     def write_dumpfile(self, filename, env, robots):
         name = filename.split('.')
-        name.insert(1, '_DUMP.')
-        _filename = ''.join(name)
-        
-        dests = []
-        for d in sorted(self.dest_list, key=lambda dest: dest.name):
-            dests.append(d)
+        name[0] += '_DUMP'
+        name[1] = 'npz'
+        _filename = '.'.join(name)
         
-        f = open(self.path+env+"/dumps/"+robots+'/'+_filename, 'w')
-        pickle.dump(dests, f)
-        f.close()
+        if self.sink is not None:
+            self.sink.flush()
+            run = idleness_dump.read_stream(self.sink.filename, end=now().to_sec())
+        else:
+            dests = sorted(self.dest_list, key=lambda dest: dest.name)
+            run = idleness_dump.from_destinations(dests, environment=env, robots=robots, end=now().to_sec())
+        idleness_dump.write_run(self.path + env + "/dumps/" + robots + '/' + _filename, run)
 
 
 class IdlenessAnalizer(object):
     def __init__(self, maindir=DEFAULT_PATH):
         self.maindir = maindir
+        self.settings = {}  # parameters of the latest interferences() call
     
     @staticmethod
     def load(filename):
         """
-        loads the serialized destinations from the path+filename provided
-        :param filename: (str) name of the file
-        :return: list of the deserialized destinations
+        loads the observations of a run from the path+filename provided
+        :param filename: (str) name of the dump, or of the PrettyTable of the run
+        :return: (RunTable) observations of the run
         """
-        if not filename.endswith("_DUMP.txt"):
+        if not filename.endswith(idleness_dump.DUMP_SUFFIX) and not filename.endswith(idleness_dump.PICKLE_SUFFIX):
             name = filename.split(".")
-            return pickle.load(open(name[0]+"_DUMP.txt", 'rb'))
+            filename = name[0] + idleness_dump.DUMP_SUFFIX
+            if not os.path.exists(filename):
+                filename = name[0] + idleness_dump.PICKLE_SUFFIX
         
-        return pickle.load(open(filename, 'rb'))
+        return idleness_dump.read_run(filename)
     
-    def interferences(self):
-        environments = os.listdir(self.maindir)
-        environment_averages = []
+    @staticmethod
+    def list_runs(dumpdir):
+        """
+        :return: (list) dumps of dumpdir, old pickles and streams are left out once converted (dumped)
+        """
+        files = os.listdir(dumpdir)
+        runs = [f for f in files if f.endswith(idleness_dump.DUMP_SUFFIX)]
+        for suffix in (idleness_dump.PICKLE_SUFFIX, idleness_dump.STREAM_SUFFIX):
+            for f in files:
+                converted = f[:-len(suffix)] + idleness_dump.DUMP_SUFFIX
+                if f.endswith(suffix) and converted not in files:
+                    runs.append(f)
+        
+        return sorted(runs)
     
-        for env in sorted(environments):
-            robots_num = os.listdir(self.maindir + env)
-            robots_num.remove('dumps')
-            robots_averages = []
+    def list_dirs(self, path):
+        """
+        :return: (list) sorted subfolders of path, hidden ones (e.g. the cache) left out
+        """
+        return sorted(
+            d for d in os.listdir(path)
+            if not d.startswith('.') and os.path.isdir(os.path.join(path, d))
+        )
+    
+    def list_all_runs(self):
+        """
+        :return: (list) (env, robot, dump path relative to maindir) of every run
+        """
+        runs = []
+        for env in self.list_dirs(self.maindir):
+            for robot in self.list_dirs(self.maindir + env + '/dumps/'):
+                for run in self.list_runs(self.maindir + env + '/dumps/' + robot):
+                    runs.append((env, robot, env + '/dumps/' + robot + '/' + run))
+        
+        return runs
+    
+    def load_cache(self):
+        """
+        :return: (dict) dump path relative to maindir -> [mtime, run summary]
+        """
+        try:
+            with open(self.maindir + CACHE_FILE, 'r') as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        
+        if cache.get('version') != CACHE_VERSION:  # summaries of an older summarize_run
+            return {}
+        return cache['runs']
+    
+    def save_cache(self, cache):
+        try:
+            with open(self.maindir + CACHE_FILE, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'runs': cache}, f)
+        except IOError as e:
+            print "Summaries cache not saved: %s" % e
+    
+    def interferences(self, processes=None, cache=True, confidence=0.95, precision=0.05, resamples=5000,
+                      seed=BOOTSTRAP_SEED):
+        """
+        :param (int) processes: size of the pool loading the dumps, cpu count if None
+        :param (bool) cache: reuse the summaries of the runs whose dump didn't change
+        :param (float) confidence: confidence level of the bootstrap intervals
+        :param (float) precision: half-width of the interval of the average interference, relative to it,
+            used to estimate the runs each (env, robots) cell needs
+        :param (int) resamples: bootstrap resamples
+        :param (int) seed: seed of the bootstrap resamples of every cell
+        :return: (list) per environment, per robot number averages
+        """
+        self.settings = {'confidence': confidence, 'precision': precision, 'resamples': resamples, 'seed': seed}
+        runs = self.list_all_runs()
+        summaries = self.load_cache() if cache else {}
+        mtimes = dict((path, os.path.getmtime(self.maindir + path)) for env, robot, path in runs)
+        missing = [path for env, robot, path in runs if summaries.get(path, [None])[0] != mtimes[path]]
+        
+        if len(missing) > 1:
+            pool = Pool(processes)
+            try:
+                results = pool.map(summarize_run, [self.maindir + path for path in missing])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [summarize_run(self.maindir + path) for path in missing]
+        
+        for path, summary in zip(missing, results):
+            summaries[path] = [mtimes[path], summary]
+        if cache and missing:
+            self.save_cache(dict((path, summaries[path]) for env, robot, path in runs))
         
-            for robot in sorted(robots_num):
-                runs = os.listdir(self.maindir + env + '/dumps/' + robot)
+        environment_averages = []
+        for env in self.list_dirs(self.maindir):
+            robots_averages = []
+            
+            for robot in self.list_dirs(self.maindir + env + '/dumps/'):
                 runs_interf_avgs = []
                 true_idl_avgs = []
+                time_idl_avgs = []
+                worst_idls = []
                 observs_num = 0
-            
-                for run in runs:
-                    dests = self.load(self.maindir + env + '/dumps/' + robot + '/' + run)
-                    observs = []
+                estimated_num = 0
                 
-                    for d in dests:
-                        if d.get_visits():  # != []
-                            observs.extend(d.get_visits())
+                for path in [p for e, r, p in runs if (e, r) == (env, robot)]:
+                    summary = summaries[path][1]
+                    if summary is not None:
+                        observs_num += summary['visits']
+                        estimated_num += summary['estimated visits']
+                        runs_interf_avgs.append(summary['avg interf'])
+                        true_idl_avgs.append(summary['avg idleness'])
+                        time_idl_avgs.append(summary['time avg idleness'])
+                        worst_idls.append(summary['worst idleness'])
                 
-                    if observs:  # != []
-                        observs_num += len(observs)
-                        runs_interf_avgs.append(np.mean([o.get_interference() for o in observs]))
-                        true_idl_avgs.append(np.mean([o.idleness.get_true() for o in observs]))
-            
                 if runs_interf_avgs:  # != []
                     robots_averages.append({
                         'robot_num': int(robot),
                         'avg interf': round(np.mean(runs_interf_avgs), 4),
                         'avg idleness': round(np.mean(true_idl_avgs), 4),
-                        'visits': observs_num
+                        'visits': observs_num,
+                        'estimated visits': estimated_num,
+                        'time avg idleness': round(np.mean(time_idl_avgs), 4),
+                        'worst idleness': round(np.max(worst_idls), 4),
+                        'runs': len(runs_interf_avgs),
+                        'interf ci': idleness_stats.bootstrap_ci(runs_interf_avgs, confidence, resamples, random_state=seed),
+                        'idleness ci': idleness_stats.bootstrap_ci(true_idl_avgs, confidence, resamples, random_state=seed),
+                        'runs needed': idleness_stats.runs_needed(runs_interf_avgs, precision, confidence, resamples,
+                                                                  random_state=seed)
                     })
-        
+            
+            robots_averages.sort(key=lambda e: e['robot_num'])
             environment_averages.append({'environment': env, 'stats': robots_averages})
-    
+        
         return environment_averages
     
     @staticmethod
     def single_plot(robot_range, env):
+        import matplotlib.pyplot as plt
+        
         fig, axs = plt.subplots(3)
     
         avg_interf = [e['avg interf'] for e in env['stats']]
@@ -220,32 +393,37 @@ class IdlenessAnalizer(object):
         
         plt.show()
     
+    @staticmethod
+    def convergence_report(env_averages):
+        """
+        :return: (str) table of the (env, robots) cells, the ones needing more runs first
+        """
+        pt = PrettyTable()
+        pt.field_names = ['Environment', 'Robots', 'Runs', 'Runs needed', 'Avg interf', 'Interf CI',
+                          'Avg idleness', 'Idleness CI', 'Time avg idleness', 'Worst idleness', 'Estimated visits']
+        
+        cells = [(env['environment'], e) for env in env_averages for e in env['stats']]
+        missing = lambda e: (e['runs needed'] or e['runs']) - e['runs'] if e['runs'] > 1 else float('inf')
+        for env, e in sorted(cells, key=lambda c: -missing(c[1])):
+            ci = lambda bounds: '[%s, %s]' % tuple(round(b, 4) for b in bounds) if bounds else '-'
+            pt.add_row([
+                env, e['robot_num'], e['runs'], e['runs needed'] if e['runs needed'] is not None else '-',
+                e['avg interf'], ci(e['interf ci']), e['avg idleness'], ci(e['idleness ci']),
+                e['time avg idleness'], e['worst idleness'], e['estimated visits']
+            ])
+        
+        more = len([c for c in cells if missing(c[1]) > 0])
+        return "%s\n%s of %s cells need more runs" % (pt, more, len(cells))
+    
     @staticmethod
     def three_plots(robot_range, env_averages):
-        # ticks = plt.xticks(fontsize=25)
+        """
+        :param (list) robot_range: robot numbers on the x axis, the ones found in the dumps of each environment if None
+        """
+        import matplotlib.pyplot as plt
+        
         for env in env_averages:
-            # plt.xlabel("Robot number", fontsize="xx-large")
-            # plt.ylabel("Interference", fontsize="xx-large")
-            fig, axs = plt.subplots(3)
-            
-            avg_interf = [e['avg interf'] for e in env['stats']]
-            avg_idl = [e['avg idleness'] for e in env['stats']]
-            visits = [e['visits'] for e in env['stats']]
-            
-            axs[0].plot(robot_range, avg_interf, 'r', marker="o")
-            # axs[0].set_xticks(ticks)
-            axs[0].set_title('Average interference', fontsize=18)
-            
-            axs[1].plot(robot_range, avg_idl, 'g', marker="o")
-            # axs[1].set_xticks(ticks)
-            axs[1].set_title('Average idleness', fontsize=18)
-            
-            axs[2].plot(robot_range, visits, 'b', marker="o")
-            # axs[2].set_xticks(ticks)
-            axs[2].set_title('Visits number', fontsize=18)
-            
-            fig.suptitle(env['environment'], fontsize=22)
-            fig.tight_layout()
+            idleness_figures.plot_environment(plt, env, robot_range)
 
         plt.show(block=False)
         try:
@@ -253,12 +431,86 @@ class IdlenessAnalizer(object):
         except:
             pass
         plt.close('all')
+    
+    def export(self, env_averages, outdir, formats=('png',), robot_range=None, processes=None):
+        """
+        renders without display, in a process pool, the figures of every environment and the
+        per-destination idleness histograms of every (env, robots) cell, skipping the unchanged ones
+        
+        :param (str) outdir: folder of the figures
+        :param (tuple) formats: file formats, e.g. ('png', 'svg', 'pdf')
+        """
+        cells = {}
+        for env, robot, path in self.list_all_runs():
+            cells.setdefault((env, robot), []).append([self.maindir + path, os.path.getmtime(self.maindir + path)])
+        
+        jobs = []
+        for env in env_averages:
+            # the averages are derived from the dumps of the environment and the settings of the analysis
+            dumps = [d for (e, robot), ds in sorted(cells.items()) if e == env['environment'] for d in ds]
+            jobs.append({
+                'kind': 'environment', 'name': env['environment'],
+                'env': env, 'robot_range': robot_range,
+                'inputs': {'dumps': dumps, 'settings': self.settings, 'robot_range': robot_range}
+            })
+        
+        for (env, robot), dumps in sorted(cells.items()):
+            jobs.append({
+                'kind': 'histograms', 'name': '%s-%sbots-histograms' % (env, robot),
+                'environment': env, 'robots': int(robot), 'dumps': dumps
+            })
+        
+        rendered, skipped = idleness_figures.export(jobs, outdir, formats=formats, processes=processes)
+        print "%s figures rendered, %s unchanged, in %s" % (len(rendered), len(skipped), outdir)
 
 
-if __name__ == '__main__':
-    robot_range = [3, 4, 5, 6, 7, 8]
+def summarize_run(filename):
+    """
+    module level, hence it can be mapped by a multiprocessing Pool
+
+    :param (str) filename: path of the dump of a run
+    :return: (dict) average interference, average true idleness, number of the visits and of the ones
+        left out for their euclidean path length, time-averaged and worst-case idleness, None if there are no visits
+    """
+    table = IdlenessAnalizer.load(filename)
+    stats = idleness_stats.run_stats(table)
+    if not stats['visits']:
+        return None
+    
+    summary = dict((key, stats[key]) for key in ['avg interf', 'avg idleness', 'visits', 'estimated visits'])
+    summary.update(idleness_timeseries.run_metrics(table))
+    return summary
 
-    ia = IdlenessAnalizer()
-    environmental_interferences = ia.interferences()
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--maindir', type=str, default=DEFAULT_PATH,
+                        help='Folder holding the $(env)/dumps/$(robotnum)/ subfolders, e.g. the output of patrol_simulator.py')
+    parser.add_argument('--processes', type=int, help='Processes loading the dumps, cpu count if not set')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='Reload every dump')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the intervals')
+    parser.add_argument('--precision', type=float, default=0.05,
+                        help='Target half-width of the interference interval, relative to the average')
+    parser.add_argument('--resamples', type=int, default=5000, help='Bootstrap resamples')
+    parser.add_argument('--seed', type=int, default=BOOTSTRAP_SEED, help='Seed of the bootstrap resamples')
+    parser.add_argument('--robots', type=int, nargs='+', help='Robot numbers to plot, every one found if not set')
+    parser.add_argument('--export', type=str, help='Folder where the figures are saved instead of being shown')
+    parser.add_argument('--formats', type=str, nargs='+', default=['png'], help='Formats of the exported figures')
+    args, unknown = parser.parse_known_args()
+    
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    ia = IdlenessAnalizer(maindir=os.path.join(args.maindir, ''))
+    environmental_interferences = ia.interferences(processes=args.processes, cache=args.cache,
+                                                   confidence=args.confidence, precision=args.precision,
+                                                   resamples=args.resamples, seed=args.seed)
     # pprint(environmental_interferences)
-    ia.three_plots(robot_range, environmental_interferences)
+    print ia.convergence_report(environmental_interferences)
+    if args.export:
+        ia.export(environmental_interferences, args.export, formats=tuple(args.formats),
+                  robot_range=args.robots, processes=args.processes)
+    else:
+        ia.three_plots(args.robots, environmental_interferences)
@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+
+"""
+    columnar dump of the idleness observations, read and written without rospy.
+
+    a run is stored as a numpy .npz archive ("*_DUMP.npz") holding one row per observation:
+        dest        (int16)   index of the destination in 'names'
+        true        (float64) true idleness
+        remaining   (float64) remaining idleness
+        estimated   (float64) estimated idleness
+        path_len    (float64) length of the path to the destination
+        stamp       (float64) seconds since the start of the run
+        first_visit (bool)    True if the destination never got visited: the observation spans the whole run
+        path_estimated (bool) True if path_len, hence the estimated idleness, comes from the euclidean
+                              distance because the plan length wasn't known yet
+    rows are grouped by destination (sorted by name) and ordered by time within a group.
+    the run metadata are stored as 0-d arrays: environment, robots, start, duration and version.
+
+    while a run is in progress its observations are appended, in arrival order, to a stream
+    ("*_STREAM.bin", rows of the packed ROW dtype, stamps in seconds of the clock) by an
+    ObservationSink (observation_sink.py), next to a "*_STREAM.json" holding the metadata.
+    read_run() reads a stream as well, including one that is still being written.
+
+    the dumps written before version 2 have no first_visit column: the flag is derived, only when
+    needed, from the metadata, an observation starting with the run and lasting as long as the run
+    is the one registered at shutdown for a destination never visited.
+    the dumps written before version 3 have no path_estimated column: their path lengths are all planned.
+
+    running this file alone (NOT AS NODE) converts the pickled "*_DUMP.txt" dumps
+    of a folder to the columnar format, e.g.
+        ./idleness_dump.py --maindir ../idleness/
+"""
+
+import argparse
+import copy_reg
+import json
+import os
+import pickle
+import numpy as np
+
+
+VERSION = 3
+LEGACY_DURATION = 60.0  # the pickled dumps don't store it, they were all taken with simulation_duration: 1 minute
+FIRST_TOLERANCE = 0.05  # seconds, the shutdown observations are registered right after the end of the run
+COLUMNS = ('dest', 'true', 'remaining', 'estimated', 'path_len', 'stamp', 'first_visit', 'path_estimated')
+PICKLE_SUFFIX = '_DUMP.txt'
+DUMP_SUFFIX = '_DUMP.npz'
+STREAM_SUFFIX = '_STREAM.bin'
+STREAM_META_SUFFIX = '_STREAM.json'
+PARTIAL_SUFFIX = '.part'  # files being written, renamed once complete
+
+ROW = np.dtype([
+    ('dest', '<i2'), ('true', '<f8'), ('remaining', '<f8'), ('estimated', '<f8'),
+    ('path_len', '<f8'), ('stamp', '<f8'), ('first_visit', '?'), ('path_estimated', '?')
+])  # packed, same layout as struct '<hddddd??'
+ROW_V2 = np.dtype([
+    ('dest', '<i2'), ('true', '<f8'), ('remaining', '<f8'),
+    ('estimated', '<f8'), ('path_len', '<f8'), ('stamp', '<f8'), ('first_visit', '?')
+])  # streams written before version 3
+ROW_V1 = np.dtype([
+    ('dest', '<i2'), ('true', '<f8'), ('remaining', '<f8'),
+    ('estimated', '<f8'), ('path_len', '<f8'), ('stamp', '<f8')
+])  # streams written before version 2
+
+
+class RunTable(object):
+    def __init__(self, names, columns, environment, robots, start=0.0, duration=0.0, span=None):
+        """
+        :param (list) names: destination names, indexed by the 'dest' column
+        :param (dict) columns: column name -> np.ndarray, as listed in COLUMNS,
+            first_visit may be missing or None: it is then derived from the metadata,
+            path_estimated may be missing or None: every path length is then a planned one
+        :param (float) span: length of the run the derivation of first_visit compares to, duration if None
+        """
+        self.names = list(names)
+        self.environment = environment
+        self.robots = robots
+        self.start = start
+        self.duration = duration
+        self.span = duration if span is None else span
+
+        self.dest = np.asarray(columns['dest'], dtype=np.int16)
+        self.true = np.asarray(columns['true'], dtype=float)
+        self.remaining = np.asarray(columns['remaining'], dtype=float)
+        self.estimated = np.asarray(columns['estimated'], dtype=float)
+        self.path_len = np.asarray(columns['path_len'], dtype=float)
+        self.stamp = np.asarray(columns['stamp'], dtype=float)
+        first_visit = columns.get('first_visit')
+        self.__first_visit = None if first_visit is None else np.asarray(first_visit, dtype=bool)
+        path_estimated = columns.get('path_estimated')
+        if path_estimated is None:
+            path_estimated = np.zeros(len(self.dest), dtype=bool)
+        self.path_estimated = np.asarray(path_estimated, dtype=bool)
+
+    def __len__(self):
+        return len(self.dest)
+
+    @property
+    def first_visit(self):
+        if self.__first_visit is None:  # dumps without the flag, the observations spanning the whole run
+            starts_with_run = self.stamp - self.true <= FIRST_TOLERANCE
+            self.__first_visit = starts_with_run & (self.true >= self.span - FIRST_TOLERANCE)
+        return self.__first_visit
+
+    def rows(self, name):
+        """
+        :return: (np.ndarray) boolean mask of the observations of the destination called name
+        """
+        return self.dest == self.names.index(name)
+
+    def null(self):
+        """
+        same as Idleness.is_null(), for every row
+        """
+        return (self.remaining == self.true) & (self.estimated == 0)
+
+    def first(self):
+        """
+        same as Idleness.is_first(), for every row
+        """
+        return self.first_visit
+
+    def visits(self):
+        """
+        same as Destination.get_visits(), for every row: the visits whose path length is the
+        euclidean estimate are left out, their estimated idleness is too low
+
+        :return: (np.ndarray) boolean mask of the visits
+        """
+        return ~self.null() & ~self.first() & ~self.path_estimated
+
+    def estimated_visits(self):
+        """
+        :return: (np.ndarray) boolean mask of the visits left out of visits() for their euclidean path length
+        """
+        return ~self.null() & ~self.first() & self.path_estimated
+
+    def interference(self):
+        """
+        same as Observation.get_interference(), for every row
+        """
+        return (self.remaining - self.estimated) / self.path_len
+
+
+def from_destinations(destinations, environment, robots, end=None):
+    """
+    :param (list) destinations: Destinations, sorted as they have to be stored
+    :param (float) end: seconds of the clock at the end of the run, latest stamp if None
+    :return: (RunTable) the observations of destinations
+    """
+    names = []
+    rows = []
+    firsts = []
+    estimates = []
+    starts = set()
+    for i, d in enumerate(destinations):
+        names.append(d.name)
+        for o in d.get_stats():
+            idl = o.idleness
+            rows.append((i, idl.get_true(), idl.get_remaining(), idl.get_estimated(), o.path_len,
+                         np.nan if o.stamp is None else o.stamp))
+            firsts.append(idl.is_first())
+            estimates.append(o.path_estimated)
+            if o.start is not None:
+                starts.add(o.start)
+
+    numeric = COLUMNS[:-2]  # the flags are collected apart
+    table = np.array(rows, dtype=float).reshape(-1, len(numeric))
+    columns = dict((c, table[:, k]) for k, c in enumerate(numeric))
+    columns['first_visit'] = None if None in firsts else np.array(firsts, dtype=bool)
+    columns['path_estimated'] = np.array(estimates, dtype=bool)
+
+    stamp = columns['stamp']
+    span = None
+    if np.isnan(stamp).any():  # observations of the old dumps, the stamps are rebuilt from the idlenesses
+        stamp = _cumulative_stamps(columns['dest'], columns['true'])
+        start = 0.0
+        span = LEGACY_DURATION
+    elif starts:
+        start = min(starts)
+        stamp = stamp - start
+    else:
+        # the first observation of a destination covers the time since its creation, the start of the run
+        first = np.ones(len(stamp), dtype=bool)
+        first[1:] = columns['dest'][1:] != columns['dest'][:-1]
+        start = float(np.min(stamp[first] - columns['true'][first])) if len(stamp) else 0.0
+        stamp = stamp - start
+    columns['stamp'] = stamp
+
+    if end is not None:
+        duration = end - start
+    else:
+        duration = float(stamp.max()) if len(stamp) else 0.0
+    if span is not None:  # the old runs lasted LEGACY_DURATION, not until their latest observation
+        duration = max(duration, span)
+
+    return RunTable(names, columns, environment=environment, robots=int(robots), start=start, duration=duration,
+                    span=span)
+
+
+def _cumulative_stamps(dest, true):
+    """
+    the true idleness is the time elapsed since the previous observation of the destination,
+    hence the running sum of a destination's true idlenesses is the stamp of its observations
+    """
+    stamps = np.cumsum(true)
+    first = np.flatnonzero(np.r_[True, dest[1:] != dest[:-1]])
+    offsets = np.r_[0.0, stamps][first]  # sum of the previous groups
+    return stamps - np.repeat(offsets, np.diff(np.r_[first, len(dest)]))
+
+
+def write_run(filename, run):
+    """
+    the archive is written to a temporary file renamed to filename once complete,
+    a writer stopped halfway never leaves a truncated dump behind
+
+    :param (str) filename: path of the .npz file
+    :param (RunTable) run: observations to store
+    """
+    columns = dict((c, getattr(run, c)) for c in COLUMNS)
+    partial = filename + PARTIAL_SUFFIX
+    with open(partial, 'wb') as f:
+        np.savez_compressed(
+            f, names=np.array(run.names, dtype=str), version=VERSION,
+            environment=run.environment, robots=run.robots, start=run.start, duration=run.duration,
+            **columns
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(partial, filename)
+
+
+def read_run(filename):
+    """
+    :param (str) filename: path of a "*_DUMP.npz" file, of a "*_STREAM.bin" or of an old "*_DUMP.txt" pickle
+    :return: (RunTable) the observations of the run
+    """
+    if filename.endswith(PICKLE_SUFFIX):
+        return read_pickle(filename)
+    if filename.endswith(STREAM_SUFFIX):
+        return read_stream(filename)
+
+    archive = np.load(filename)
+    try:
+        start = float(archive['start'])
+        duration = float(archive['duration'])
+        span = None
+        if int(archive['version']) < 2 and start == 0.0:  # converted from an old pickle, see from_destinations()
+            span = LEGACY_DURATION
+            duration = max(duration, span)
+        return RunTable(
+            [str(name) for name in archive['names']],
+            dict((c, archive[c]) for c in COLUMNS if c in archive.files),
+            environment=str(archive['environment']), robots=int(archive['robots']),
+            start=start, duration=duration, span=span
+        )
+    finally:
+        archive.close()
+
+
+def read_stream(filename, rows=None, end=None):
+    """
+    a trailing row still being written is left out
+
+    :param (str) filename: path of a "*_STREAM.bin" file
+    :param (int) rows: reads only the first rows, all of them if None
+    :param (float) end: seconds of the clock at the end of the run, latest stamp if None
+    :return: (RunTable) the observations of the run, grouped by destination
+    """
+    with open(filename[:-len(STREAM_SUFFIX)] + STREAM_META_SUFFIX, 'r') as f:
+        meta = json.load(f)
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    version = meta.get('version', 1)
+    row = ROW if version >= 3 else ROW_V2 if version == 2 else ROW_V1
+    count = len(data) // row.itemsize
+    if rows is not None:
+        count = min(count, rows)
+    stream = np.frombuffer(data, dtype=row, count=count)
+    stream = stream[np.argsort(stream['dest'], kind='mergesort')]  # stable, keeps the time order
+
+    columns = dict((c, stream[c]) for c in row.names)
+    columns['stamp'] = stream['stamp'] - meta['start']
+    if end is not None:
+        duration = end - meta['start']
+    else:
+        duration = float(columns['stamp'].max()) if count else 0.0
+
+    return RunTable([str(name) for name in meta['names']], columns, environment=str(meta['environment']),
+                    robots=int(meta['robots']), start=meta['start'], duration=duration)
+
+
+# --- old pickled dumps
+class _Time(object):
+    """
+    stands in for rospy.Time
+    """
+    def __setstate__(self, state):
+        self.secs, self.nsecs = state
+
+    def to_sec(self):
+        return self.secs + self.nsecs * 1e-9
+
+
+class _Message(object):
+    """
+    stands in for the geometry_msgs messages, the values are kept in slot order
+    """
+    def __setstate__(self, state):
+        self.values = state
+
+
+class _Destination(object):
+    def get_stats(self):
+        return self.__dict__['_Destination__stats']
+
+
+class _Observation(object):
+    stamp = None
+    start = None
+    path_estimated = False
+
+
+class _Idleness(object):
+    def get_true(self):
+        return self.__dict__['_Idleness__true_idl']
+
+    def get_remaining(self):
+        return self.__dict__['_Idleness__remaining_idl']
+
+    def get_estimated(self):
+        return self.__dict__['_Idleness__estim_idl']
+
+    def is_first(self):
+        return self.__dict__.get('_Idleness__first')  # None in the old dumps, derived by RunTable
+
+
+class DumpUnpickler(pickle.Unpickler):
+    """
+    unpickles the old dumps without rospy, geometry_msgs and destination.py
+    and refuses any other class
+    """
+    CLASSES = {
+        ('copy_reg', '_reconstructor'): copy_reg._reconstructor,
+        ('__builtin__', 'object'): object,
+        ('rospy.rostime', 'Time'): _Time,
+        ('geometry_msgs.msg._Pose', 'Pose'): _Message,
+        ('geometry_msgs.msg._Point', 'Point'): _Message,
+        ('geometry_msgs.msg._Quaternion', 'Quaternion'): _Message,
+        ('destination', 'Destination'): _Destination,
+        ('destination', 'Observation'): _Observation,
+        ('destination', 'Idleness'): _Idleness,
+    }
+
+    def find_class(self, module, name):
+        try:
+            return self.CLASSES[(module, name)]
+        except KeyError:
+            raise pickle.UnpicklingError('%s.%s not allowed in a dump' % (module, name))
+
+
+def read_pickle(filename):
+    """
+    :param (str) filename: path of an old "*_DUMP.txt" file
+    :return: (RunTable) the observations of the run, environment and robots are taken from the path
+    """
+    with open(filename, 'rb') as f:
+        dests = DumpUnpickler(f).load()
+
+    robots = os.path.basename(os.path.dirname(filename))
+    environment = os.path.basename(os.path.dirname(os.path.dirname(os.path.dirname(filename))))
+
+    return from_destinations(dests, environment=environment, robots=robots)
+
+
+def convert(maindir, overwrite=False):
+    """
+    converts every "*_DUMP.txt" under maindir to a "*_DUMP.npz" next to it
+
+    :return: (list) paths of the written files
+    """
+    written = []
+    for root, dirs, files in os.walk(maindir):
+        for name in sorted(files):
+            if not name.endswith(PICKLE_SUFFIX):
+                continue
+
+            src = os.path.join(root, name)
+            dst = src[:-len(PICKLE_SUFFIX)] + DUMP_SUFFIX
+            if os.path.exists(dst) and not overwrite:
+                continue
+
+            write_run(dst, read_pickle(src))
+            written.append(dst)
+
+    return written
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--maindir', type=str, required=True, help='Folder holding the pickled dumps')
+    parser.add_argument('--overwrite', action='store_true', help='Convert dumps already converted')
+    args, unknown = parser.parse_known_args()
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    written = convert(args.maindir, overwrite=args.overwrite)
+    print "Converted %s dumps" % len(written)
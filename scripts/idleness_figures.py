@@ -0,0 +1,181 @@
+"""
+    figures of IdlenessAnalizer (idleness_analysis.py).
+
+    the same drawing functions serve the interactive windows and the export mode:
+    + export() renders every figure with the non-GUI Agg backend in a pool of worker processes,
+      to one file per requested format (png, svg, pdf ...)
+    + every figure is described by a job holding the inputs it is drawn from, a hash of those
+      inputs is kept in "$(outdir)/.manifest.json" and figures whose inputs didn't change are skipped
+    + a job computed from other inputs (e.g. averages of the dumps) gives them in 'inputs',
+      then only those are hashed
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+
+from multiprocessing import Pool
+
+import idleness_dump
+
+
+MANIFEST_FILE = '.manifest.json'
+
+
+def error_bars(stats, mean_key, ci_key):
+    """
+    :return: (np.ndarray) (2 x cells) distances of the confidence bounds from the means, 0 without interval
+    """
+    bars = np.zeros((2, len(stats)))
+    for i, e in enumerate(stats):
+        if e[ci_key] is not None:
+            bars[0, i] = max(e[mean_key] - e[ci_key][0], 0)
+            bars[1, i] = max(e[ci_key][1] - e[mean_key], 0)
+    return bars
+
+
+def plot_environment(plt, env, robot_range=None):
+    """
+    :param plt: matplotlib.pyplot, imported by the caller with the backend it needs
+    :param (dict) env: averages of an environment, as returned by IdlenessAnalizer.interferences()
+    :param (list) robot_range: robot numbers on the x axis, every one of env if None
+    :return: the figure
+    """
+    # ticks = plt.xticks(fontsize=25)
+    # plt.xlabel("Robot number", fontsize="xx-large")
+    # plt.ylabel("Interference", fontsize="xx-large")
+    fig, axs = plt.subplots(3)
+
+    stats = env['stats']
+    if robot_range is not None:
+        stats = [e for e in stats if e['robot_num'] in robot_range]
+    x = [e['robot_num'] for e in stats]
+    avg_interf = [e['avg interf'] for e in stats]
+    avg_idl = [e['avg idleness'] for e in stats]
+    visits = [e['visits'] for e in stats]
+
+    axs[0].errorbar(x, avg_interf, yerr=error_bars(stats, 'avg interf', 'interf ci'),
+                    color='r', marker="o", capsize=4)
+    # axs[0].set_xticks(ticks)
+    axs[0].set_title('Average interference', fontsize=18)
+
+    axs[1].errorbar(x, avg_idl, yerr=error_bars(stats, 'avg idleness', 'idleness ci'),
+                    color='g', marker="o", capsize=4)
+    # axs[1].set_xticks(ticks)
+    axs[1].set_title('Average idleness', fontsize=18)
+
+    axs[2].plot(x, visits, 'b', marker="o")
+    # axs[2].set_xticks(ticks)
+    axs[2].set_title('Visits number', fontsize=18)
+
+    fig.suptitle(env['environment'], fontsize=22)
+    fig.tight_layout()
+    return fig
+
+
+def plot_histograms(plt, environment, robots, dumps, bins=20):
+    """
+    one histogram of the true idleness of the visits for every destination, over all the runs of a cell
+
+    :param (list) dumps: paths of the dumps of the runs
+    :return: the figure
+    """
+    idleness = {}  # destination name -> arrays of the true idleness of its visits
+    for dump in dumps:
+        table = idleness_dump.read_run(dump)
+        visits = table.visits()
+        for i, name in enumerate(table.names):
+            idleness.setdefault(name, []).append(table.true[visits & (table.dest == i)])
+
+    names = sorted(idleness.keys())
+    cols = int(np.ceil(np.sqrt(len(names)))) or 1
+    rows = int(np.ceil(len(names) / float(cols))) or 1
+    fig, axs = plt.subplots(rows, cols, figsize=(3 * cols, 2.5 * rows), squeeze=False)
+
+    for ax, name in zip(axs.flat, names):
+        ax.hist(np.concatenate(idleness[name]), bins=bins, color='g')
+        ax.set_title(name, fontsize=10)
+    for ax in list(axs.flat)[len(names):]:
+        ax.axis('off')
+
+    fig.suptitle('%s, %s robots: true idleness of the visits' % (environment, robots), fontsize=14)
+    fig.tight_layout(rect=(0, 0, 1, 0.95))
+    return fig
+
+
+def render(job):
+    """
+    module level, hence it can be mapped by a multiprocessing Pool
+
+    :param (dict) job: 'kind', 'name', 'files' (one per format) and the inputs of the figure
+    :return: (str) name of the rendered figure
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # no display needed
+    import matplotlib.pyplot as plt
+
+    if job['kind'] == 'environment':
+        fig = plot_environment(plt, job['env'], job['robot_range'])
+    else:
+        fig = plot_histograms(plt, job['environment'], job['robots'], [d for d, mtime in job['dumps']])
+
+    for filename in job['files']:
+        fig.savefig(filename)
+    plt.close(fig)
+    return job['name']
+
+
+def job_hash(job):
+    """
+    :return: (str) hash of the 'inputs' of job if given, of every entry but the files otherwise
+    """
+    inputs = job.get('inputs')
+    if inputs is None:
+        inputs = dict((k, v) for k, v in job.items() if k != 'files')
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True)).hexdigest()
+
+
+def export(jobs, outdir, formats=('png',), processes=None):
+    """
+    :param (list) jobs: figures to render, see render()
+    :param (str) outdir: folder of the figures
+    :param (tuple) formats: extensions matplotlib can save to
+    :return: (tuple) names of the rendered figures and of the skipped ones
+    """
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    manifest_file = os.path.join(outdir, MANIFEST_FILE)
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        manifest = {}
+
+    todo = []
+    skipped = []
+    for job in jobs:
+        job['files'] = [os.path.join(outdir, '%s.%s' % (job['name'], fmt)) for fmt in formats]
+        digest = job_hash(job)
+        if manifest.get(job['name']) == digest and all(os.path.exists(f) for f in job['files']):
+            skipped.append(job['name'])
+        else:
+            todo.append((job, digest))
+
+    if len(todo) > 1:
+        pool = Pool(processes)
+        try:
+            rendered = pool.map(render, [job for job, digest in todo])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        rendered = [render(job) for job, digest in todo]
+
+    for job, digest in todo:
+        manifest[job['name']] = digest
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    return rendered, skipped
@@ -0,0 +1,149 @@
+"""
+    vectorised statistics of the idleness observations, used by idleness_analysis.py.
+
+    the statistics are computed on the columns of a RunTable (idleness_dump.py):
+    + visits and null/first observations are boolean masks
+    + per-destination aggregates work on the contiguous slices of the rows of each destination
+    means and variances are computed by numpy on the same values, in the same order,
+    as the former per-object loops, hence the results are identical to the digit.
+    + bootstrap confidence intervals of the per-run averages, with all the resamples drawn at once
+"""
+
+import numpy as np
+
+
+PERCENTILES = (50, 90, 95)
+
+
+def group_bounds(dest):
+    """
+    :param (np.ndarray) dest: destination id of every row, rows grouped by destination
+    :return: (tuple) ids of the destinations, start and end row of their groups
+    """
+    if len(dest) == 0:
+        return np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype=int)
+
+    starts = np.flatnonzero(np.r_[True, dest[1:] != dest[:-1]])
+    ends = np.r_[starts[1:], len(dest)]
+    return dest[starts], starts, ends
+
+
+def destination_stats(table, percentiles=PERCENTILES):
+    """
+    :param (RunTable) table: observations of a run
+    :param (tuple) percentiles: percentiles of the true idleness to compute
+    :return: (dict) one array per statistic, one entry per destination having observations:
+        dest, observations, visits, mean, var, min, max, p<q> of the true idleness,
+        'avg interf', the mean interference of the visits (nan without visits)
+        and 'estimated visits', the visits left out for their euclidean path length
+    """
+    ids, starts, ends = group_bounds(table.dest)
+    visits = table.visits()
+    estimated = table.estimated_visits()
+    interference = _interference(table, visits)
+    true = table.true
+
+    stats = {
+        'dest': ids,
+        'observations': ends - starts,
+        'visits': np.add.reduceat(visits.astype(int), starts) if len(starts) else np.array([], dtype=int),
+        'estimated visits': np.add.reduceat(estimated.astype(int), starts) if len(starts) else np.array([], dtype=int),
+        'min': np.minimum.reduceat(true, starts) if len(starts) else np.array([]),
+        'max': np.maximum.reduceat(true, starts) if len(starts) else np.array([]),
+        'mean': np.array([np.mean(true[s:e]) for s, e in zip(starts, ends)]),
+        'var': np.array([np.var(true[s:e]) for s, e in zip(starts, ends)]),
+        'avg interf': np.array([
+            np.mean(interference[s:e][visits[s:e]]) if visits[s:e].any() else np.nan
+            for s, e in zip(starts, ends)
+        ]),
+    }
+    for q in percentiles:
+        stats['p%s' % q] = np.array([np.percentile(true[s:e], q) for s, e in zip(starts, ends)])
+
+    return stats
+
+
+def run_stats(table, percentiles=PERCENTILES):
+    """
+    :param (RunTable) table: observations of a run
+    :param (tuple) percentiles: percentiles of the true idleness of the visits to compute
+    :return: (dict) statistics of the run:
+        visits, 'avg interf', 'avg idleness', 'var idleness' and p<q> over the visits,
+        'estimated visits', left out of the visits for their euclidean path length,
+        'avg dest mean' and 'var dest mean' over the per-destination means of all the observations.
+        the visit statistics are None when the run has no visits
+    """
+    visits = table.visits()
+    dests = destination_stats(table, percentiles=())
+
+    stats = {
+        'visits': int(visits.sum()),
+        'estimated visits': int(table.estimated_visits().sum()),
+        'avg dest mean': float(np.mean(dests['mean'])) if len(dests['mean']) else None,
+        'var dest mean': float(np.var(dests['mean'])) if len(dests['mean']) else None,
+    }
+    if visits.any():
+        true = table.true[visits]
+        stats['avg interf'] = float(np.mean(_interference(table, visits)[visits]))
+        stats['avg idleness'] = float(np.mean(true))
+        stats['var idleness'] = float(np.var(true))
+        for q in percentiles:
+            stats['p%s' % q] = float(np.percentile(true, q))
+    else:
+        for key in ['avg interf', 'avg idleness', 'var idleness'] + ['p%s' % q for q in percentiles]:
+            stats[key] = None
+
+    return stats
+
+
+def _interference(table, visits):
+    """
+    interference of the visits, nan elsewhere: the other rows may have a null path length
+    """
+    interference = np.full(len(table), np.nan)
+    interference[visits] = (table.remaining[visits] - table.estimated[visits]) / table.path_len[visits]
+    return interference
+
+
+def bootstrap_means(samples, resamples=5000, random_state=None):
+    """
+    :param samples: (np.ndarray) values to resample, e.g. the average interference of every run of a cell
+    :param (int) resamples: number of bootstrap resamples, drawn at once as a (resamples x samples) index matrix
+    :return: (np.ndarray) mean of every resample
+    """
+    samples = np.asarray(samples, dtype=float)
+    rng = np.random.RandomState(random_state)
+    idx = rng.randint(0, len(samples), size=(resamples, len(samples)))
+    return samples[idx].mean(axis=1)
+
+
+def bootstrap_ci(samples, confidence=0.95, resamples=5000, random_state=None):
+    """
+    percentile bootstrap confidence interval of the mean of samples
+
+    :return: (tuple) lower and upper bound, None if there are less than two samples
+    """
+    if len(samples) < 2:
+        return None
+
+    alpha = (1 - confidence) / 2.0
+    means = bootstrap_means(samples, resamples=resamples, random_state=random_state)
+    lower, upper = np.percentile(means, [100 * alpha, 100 * (1 - alpha)])
+    return float(lower), float(upper)
+
+
+def runs_needed(samples, precision=0.05, confidence=0.95, resamples=5000, random_state=None):
+    """
+    the half-width of the confidence interval of the mean shrinks as 1/sqrt(runs),
+    hence the runs needed for a half-width of 'precision' times the mean are extrapolated from the current one
+
+    :param (float) precision: target half-width, relative to the mean
+    :return: (int) runs needed, at least len(samples), None if it can't be estimated
+    """
+    ci = bootstrap_ci(samples, confidence=confidence, resamples=resamples, random_state=random_state)
+    target = precision * abs(np.mean(samples)) if len(samples) else 0
+    if ci is None or target == 0:
+        return None
+
+    half_width = (ci[1] - ci[0]) / 2.0
+    return max(len(samples), int(np.ceil(len(samples) * (half_width / target) ** 2)))
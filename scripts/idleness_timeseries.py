@@ -0,0 +1,121 @@
+"""
+    idleness over time, rebuilt from the observations of a run (RunTable, idleness_dump.py).
+
+    every observation marks a visit: the idleness of its destination drops to 0 at the stamp of the
+    observation and then grows linearly, 1 second per second, until the next visit. before its first
+    visit a destination is as idle as the run is old.
+    hence the idleness of a destination is a sawtooth whose teeth are the intervals between visits:
+    + its time average is the sum of the squared intervals / 2, divided by the duration
+    + its worst case is the longest interval
+    both are computed on all the destinations at once, on the grouped rows of the table.
+"""
+
+import numpy as np
+
+from idleness_stats import group_bounds
+
+
+def intervals(table, duration=None):
+    """
+    :param (RunTable) table: observations of a run
+    :param (float) duration: end of the run, table.duration if None
+    :return: (tuple) destination id and length of every interval between visits,
+        the last interval of every destination ending with the run
+    """
+    duration = table.duration if duration is None else duration
+    ids, starts, ends = group_bounds(table.dest)
+
+    previous = np.r_[0.0, table.stamp[:-1]] if len(table) else np.array([])
+    previous[starts] = 0.0  # the first interval of a destination starts with the run
+    lengths = table.stamp - previous
+    tails = duration - table.stamp[ends - 1]
+
+    dest = np.r_[table.dest, ids].astype(int)
+    lengths = np.r_[lengths, tails]
+
+    # destinations never visited are idle for the whole run
+    unvisited = np.setdiff1d(np.arange(len(table.names)), ids)
+    dest = np.r_[dest, unvisited]
+    lengths = np.r_[lengths, np.full(len(unvisited), float(duration))]
+
+    order = np.argsort(dest, kind='mergesort')
+    return dest[order], np.clip(lengths[order], 0, None)
+
+
+def time_averages(table, duration=None):
+    """
+    :return: (np.ndarray) time-averaged idleness of every destination, indexed as table.names
+    """
+    duration = table.duration if duration is None else duration
+    dest, lengths = intervals(table, duration)
+    if duration <= 0:
+        return np.zeros(len(table.names))
+
+    return np.bincount(dest, weights=lengths ** 2 / 2.0, minlength=len(table.names)) / duration
+
+
+def worst_cases(table, duration=None):
+    """
+    :return: (np.ndarray) worst-case idleness of every destination, indexed as table.names
+    """
+    dest, lengths = intervals(table, duration)
+    worst = np.zeros(len(table.names))
+    np.maximum.at(worst, dest, lengths)
+    return worst
+
+
+def curve(table, name, duration=None):
+    """
+    :param (str) name: name of the destination
+    :return: (tuple) times and idlenesses of the knots of its piecewise-linear idleness curve
+    """
+    duration = table.duration if duration is None else duration
+    visits = np.sort(table.stamp[table.rows(name)])
+
+    times = np.r_[0.0, np.repeat(visits, 2), duration]
+    previous = np.r_[0.0, visits]
+    values = np.r_[0.0, np.column_stack((visits - previous[:-1], np.zeros(len(visits)))).ravel(),
+                   duration - previous[-1]]
+    return times, values
+
+
+def sample(table, times, duration=None):
+    """
+    :param (np.ndarray) times: seconds since the start of the run
+    :return: (np.ndarray) (destinations x times) idleness of every destination at times
+    """
+    times = np.asarray(times, dtype=float)
+    idleness = np.empty((len(table.names), len(times)))
+    for i, name in enumerate(table.names):
+        visits = np.sort(table.stamp[table.dest == i])
+        latest_visit = np.zeros(len(times))  # the start of the run before the first visit
+        if len(visits):
+            latest = np.searchsorted(visits, times, side='right') - 1
+            latest_visit = np.where(latest >= 0, visits[np.clip(latest, 0, None)], 0.0)
+        idleness[i] = times - latest_visit
+    return idleness
+
+
+def aggregate(table, step=1.0, duration=None):
+    """
+    :param (float) step: seconds between two samples
+    :return: (tuple) sample times, instantaneous average and max idleness across the destinations
+    """
+    duration = table.duration if duration is None else duration
+    times = np.arange(0.0, duration + step / 2.0, step)
+    idleness = sample(table, times, duration)
+    return times, idleness.mean(axis=0), idleness.max(axis=0)
+
+
+def run_metrics(table, duration=None):
+    """
+    :return: (dict) 'time avg idleness', the time average of the average idleness across the destinations,
+        and 'worst idleness', the largest idleness any destination reached
+    """
+    if not len(table.names):
+        return {'time avg idleness': None, 'worst idleness': None}
+
+    return {
+        'time avg idleness': float(np.mean(time_averages(table, duration))),
+        'worst idleness': float(np.max(worst_cases(table, duration)))
+    }
@@ -0,0 +1,89 @@
+"""
+    file that holds the InterestPoints class, the interest points of the map cached by
+    toponavigator.py and shared with its AfferenceEngine (afference.py).
+
+    + the 'interest_points' param is read once: names go to a name table, positions
+      to an (n x 3) numpy array indexed by a SpatialIndex (spatial_index.py)
+    + toponodes_publisher.py sets the param and then publishes its version, latched,
+      on the 'interest_points_version' topic: a new version marks the cache stale
+      and the next update() reads the param again, once
+"""
+
+import hashlib
+import json
+import rospy
+import numpy as np
+
+from std_msgs.msg import String
+from geometry_msgs.msg import Point
+from plan_utils import posestamp
+from spatial_index import SpatialIndex
+
+
+def version_of(ipoints):
+    """
+    :param (list) ipoints: interest points as stored on the param server
+    :return: (str) hash of the interest points, the same map gets the same version
+    """
+    return hashlib.sha1(json.dumps(ipoints, sort_keys=True)).hexdigest()[:12]
+
+
+class InterestPoints(object):
+    def __init__(self, yaml):
+        self.param = yaml['interest_points']
+        self.version_topic = yaml['interest_points_version']
+
+        self.names = []
+        self.ids = {}  # name -> index
+        self.coords = np.zeros((0, 3))
+        self.index = None  # SpatialIndex of the x, y coordinates, None until loaded
+        self.version = None  # version loaded
+        self.__announced = None  # latest version published by toponodes_publisher
+
+    def watch(self):
+        rospy.Subscriber(self.version_topic, String, self.on_version)
+
+    def on_version(self, msg):
+        self.__announced = msg.data
+
+    def stale(self):
+        return self.index is None or (self.__announced is not None and self.__announced != self.version)
+
+    def update(self):
+        """
+        reads the param if the cache is stale, to be called by a single thread
+
+        :return: (bool) True if the interest points have been (re)loaded
+        """
+        if not self.stale():
+            return False
+
+        announced = self.__announced
+        while not rospy.has_param(self.param):
+            rospy.sleep(0.1)
+        ipoints = rospy.get_param(self.param)
+
+        self.names = [ip['name'] for ip in ipoints]
+        self.ids = dict((name, i) for i, name in enumerate(self.names))
+        self.coords = np.array([
+            (ip['pose']['position']['x'], ip['pose']['position']['y'], ip['pose']['position']['z'])
+            for ip in ipoints
+        ], dtype=float).reshape(-1, 3)
+        self.index = SpatialIndex(self.names, self.coords[:, :2])
+        self.version = announced if announced is not None else version_of(ipoints)
+        return True
+
+    def __len__(self):
+        return len(self.names)
+
+    def point(self, i):
+        """
+        :return: (Point) position of the i-th interest point
+        """
+        return Point(*self.coords[i])
+
+    def posestamp(self, i):
+        """
+        :return: (PoseStamped) pose of the i-th interest point in the map frame
+        """
+        return posestamp(*self.coords[i])
@@ -11,7 +11,6 @@
 import argparse
 import cv2
 import copy
-import math
 import numpy as np
 import signal
 import sys
@@ -24,6 +23,7 @@ from os.path import dirname, realpath, join
 from topological_map import TopologicalMap
 from topological_node import NodeEdges
 from topological_node import TopologicalNode
+from spatial_index import SpatialIndex
 
 
 script_path = realpath(dirname(__file__))
@@ -84,6 +84,9 @@ class TopologicalEditor(object):
             self._change_mode(k)
 
     def draw_top_map(self):
+        # every edit of the map redraws it, the index of the nodes is rebuilt along
+        self.index = SpatialIndex.from_topological_map(self.top_map)
+
         topmap_image = self.imgFile.copy()
         height, width, channels = topmap_image.shape
         font = cv2.FONT_HERSHEY_SIMPLEX
@@ -96,7 +99,7 @@ class TopologicalEditor(object):
         for i in self.top_map.nodes:
             v1 = i.pose.position
             for j in i.edges:
-                v2 = self.get_node(self.top_map, j.node).pose.position
+                v2 = self.get_node(j.node).pose.position
                 self.draw_arrow(topmap_image, v1, v2, (255, 0, 0, 255), origin, thickness=2, arrow_magnitude=5, line_type=1)
             xval = int((v1.x - origin[0]) / self.props['resolution'])
             yval = int((origin[1] - v1.y) / self.props['resolution'])
@@ -106,12 +109,11 @@ class TopologicalEditor(object):
             cv2.putText(topmap_image, i.name, (int(xval), int(yval - 5)), font, 0.3, (20, 20, 20), 1)
         return topmap_image
 
-    @staticmethod
-    def get_node(top_map, node_name):
-        for i in top_map.nodes:
-            if i.name == node_name:
-                return i
-        return None
+    def get_node(self, node_name):
+        i = self.index.get(node_name)
+        if i is None:
+            return None
+        return self.top_map.nodes[i]
 
     def draw_arrow(self, image, v1, v2, color, origin, arrow_magnitude=5, thickness=1, line_type=8, shift=0):
         v3 = dict()
@@ -247,9 +249,9 @@ class TopologicalEditor(object):
     def click_callback(self, event, x, y, flags, param):
         xval = (x * self.origin[2]) + self.origin[0]
         yval = -((y * self.origin[2]) - self.origin[1])
-        dists = self.get_distances_to_pose(xval, yval)
 
         if event == cv2.EVENT_LBUTTONDOWN:
+            dists = self.get_distances_to_pose(xval, yval)
             try:
                 getattr(self, 'cb_' + self.current_mode)(dists, xval, yval)
             except AttributeError:
@@ -301,19 +303,19 @@ class TopologicalEditor(object):
         # redraw top map
         self.base_img = self.draw_top_map()
 
-    def get_distances_to_pose(self, x, y):
+    def get_distances_to_pose(self, x, y, k=1):
         """
          get_distances_to_pose
-         This function returns the distance from each waypoint to a pose in an organised way
+         This function returns the distance from the k closest waypoints to a pose in an organised way
         """
 
         distances = list()
-        for node in self.top_map.nodes:
+        for dist, i in self.index.nearest(x, y, k):
             distance = dict()
-            distance['node'] = node
-            distance['dist'] = math.hypot((x - node.pose.position.x), (y - node.pose.position.y))
+            distance['node'] = self.top_map.nodes[i]
+            distance['dist'] = dist
             distances.append(distance)
-        return sorted(distances, key=lambda k: k['dist'])
+        return distances
 
     def signal_handler(self, signal, frame):
         cv2.destroyAllWindows()
@@ -0,0 +1,135 @@
+"""
+    file that holds the navigation backends of toponavigator.py, chosen with
+    'navigation_backend' in config.yaml:
+    + TopicBackend publishes the goals on 'goal_topic' (move_base_simple/goal),
+      arrival is known from the AMCL pose only
+    + ActionBackend sends them to the move_base action server: a goal aborted or
+      rejected by move_base fails the hop instead of blocking the robot forever
+
+    every goal sent is a Hop, which ends exactly once: reached, failed, timed out
+    (no progress towards the goal for 'navigation_timeout' seconds) or preempted
+    by a new topopath.
+"""
+
+import rospy
+
+from threading import Event, Lock
+from geometry_msgs.msg import PoseStamped
+
+
+REACHED = 'reached'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+PREEMPTED = 'preempted'
+
+
+class Hop(object):
+    def __init__(self, goal, timeout=0, min_progress=0.0):
+        """
+        :param goal: interest point of the topopath, its pose is a PoseStamped
+        :param (float) timeout: seconds without progress before the hop times out, 0 disables
+        :param (float) min_progress: metres the robot has to get closer to the goal to make progress
+        """
+        self.goal = goal
+        self.timeout = timeout
+        self.min_progress = min_progress
+        self.status = None
+        self.feedback = None  # latest pose reported by move_base, ActionBackend only
+
+        self.lock = Lock()
+        self.done = Event()
+        self.__best = float('inf')  # closest the robot got to the goal
+        self.__progress = rospy.get_time()  # ROS time of the latest progress, simulated with use_sim_time
+
+    def finish(self, status):
+        """
+        :return: (bool) True if the hop ended with status, False if it had already ended
+        """
+        with self.lock:
+            if self.status is not None:
+                return False
+            self.status = status
+            self.done.set()
+            return True
+
+    def update(self, distance, radius):
+        """
+        called on every AMCL pose
+
+        :param (float) distance: distance of the robot from the goal
+        :param (float) radius: the goal is reached within radius
+        """
+        if distance <= radius:
+            self.finish(REACHED)
+        elif distance < self.__best - self.min_progress:
+            self.__best = distance
+            self.__progress = rospy.get_time()
+
+    def wait(self):
+        """
+        :return: (str) status of the hop, None on shutdown
+        """
+        while not self.done.wait(0.5):  # wakes up as soon as the hop ends
+            if rospy.is_shutdown():
+                return None
+            if self.timeout and rospy.get_time() - self.__progress > self.timeout:
+                self.finish(TIMEOUT)
+        return self.status
+
+
+class TopicBackend(object):
+    def __init__(self, robot_ns, yaml, publishers):
+        self.goal_topic = robot_ns + yaml['goal_topic']
+        self.publishers = publishers
+
+    def start(self):
+        self.publishers.register(self.goal_topic, PoseStamped)
+
+    def send(self, hop):
+        self.publishers.publish(self.goal_topic, hop.goal.pose)
+
+    def cancel(self):
+        pass  # move_base_simple has no cancel, the next goal replaces the current one
+
+
+class ActionBackend(object):
+    def __init__(self, robot_ns, yaml):
+        # imported here, the topic backend doesn't need actionlib
+        import actionlib
+        from actionlib_msgs.msg import GoalStatus
+        from move_base_msgs.msg import MoveBaseAction, MoveBaseGoal
+
+        self.server = robot_ns + yaml['move_base_action']
+        self.client = actionlib.SimpleActionClient(self.server, MoveBaseAction)
+        self.goal_class = MoveBaseGoal
+        self.success = GoalStatus.SUCCEEDED
+        self.failures = (GoalStatus.ABORTED, GoalStatus.REJECTED, GoalStatus.LOST)
+
+    def start(self):
+        while not self.client.wait_for_server(rospy.Duration(5)):
+            if rospy.is_shutdown():
+                return
+            print "Waiting for the %s action server" % self.server
+
+    def send(self, hop):
+        def on_done(state, result):
+            if state == self.success:
+                hop.finish(REACHED)
+            elif state in self.failures:
+                hop.finish(FAILED)
+            # PREEMPTED and RECALLED follow a cancel() or a newer goal, the hop has already ended
+
+        def on_feedback(feedback):
+            hop.feedback = feedback.base_position
+
+        # a goal sent while another is active preempts it on the server
+        self.client.send_goal(self.goal_class(target_pose=hop.goal.pose), done_cb=on_done, feedback_cb=on_feedback)
+
+    def cancel(self):
+        self.client.cancel_goal()
+
+
+def make_backend(robot_ns, yaml, publishers):
+    if yaml['navigation_backend'] == 'action':
+        return ActionBackend(robot_ns, yaml)
+    return TopicBackend(robot_ns, yaml, publishers)
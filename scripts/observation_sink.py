@@ -0,0 +1,133 @@
+"""
+    file that holds the ObservationSink class, used by topoplanner.py through destination.set_sink().
+
+    every observation is appended to the "*_STREAM.bin" file of the run as soon as it is registered:
+    + rows are packed as idleness_dump.ROW (first visit and estimated path flags included) and buffered, the buffer is written every
+      'flush_rows' rows or 'fsync_period' seconds, whichever comes first
+    + every 'fsync_period' seconds the file is also fsync'ed, a crash loses at most that much:
+      a background thread flushes the buffer when no observation arrives to do it
+    + the metadata (destination names, environment, robots, start) are written once,
+      to "*_STREAM.json", before the first row
+    idleness_dump.read_run() reads the stream while it is still being written.
+"""
+
+import json
+import os
+import struct
+import time
+
+from threading import Event, Lock, Thread
+
+import idleness_dump
+
+
+class ObservationSink(object):
+    ROW = struct.Struct('<hddddd??')
+
+    def __init__(self, basename, names, environment, robots, start, flush_rows=32, fsync_period=10.0):
+        """
+        :param (str) basename: path of the stream without suffix, e.g. ".../dumps/3/09-02@10_11-office-3bots"
+        :param (list) names: names of the destinations, their index is stored in the rows
+        :param (float) start: seconds of the clock at the start of the run
+        """
+        assert self.ROW.size == idleness_dump.ROW.itemsize
+        self.basename = basename
+        self.filename = basename + idleness_dump.STREAM_SUFFIX
+        self.ids = dict((name, i) for i, name in enumerate(names))
+        self.flush_rows = flush_rows
+        self.fsync_period = fsync_period
+
+        self.lock = Lock()
+        self.rows = 0  # rows appended so far
+        self.__buffer = []
+        self.__latest_fsync = time.time()
+        self.__unsynced = False  # rows written but not fsync'ed yet
+
+        meta = {
+            'version': idleness_dump.VERSION, 'names': list(names),
+            'environment': environment, 'robots': robots, 'start': start
+        }
+        with open(basename + idleness_dump.STREAM_META_SUFFIX, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.file = open(self.filename, 'ab')
+
+        self.__closed = Event()
+        self.__flusher = Thread(target=self.__flush_periodically, name='observation_sink')
+        self.__flusher.daemon = True
+        self.__flusher.start()
+
+    def append(self, name, observation):
+        """
+        :param (str) name: name of the observed destination
+        :param (Observation) observation: registered observation, with its stamp
+        """
+        idl = observation.idleness
+        row = self.ROW.pack(self.ids[name], idl.get_true(), idl.get_remaining(), idl.get_estimated(),
+                            observation.path_len, observation.stamp, idl.is_first(), observation.path_estimated)
+        with self.lock:
+            if self.file is None:
+                return
+            self.__buffer.append(row)
+            self.rows += 1
+
+            checkpoint = time.time() - self.__latest_fsync >= self.fsync_period
+            if len(self.__buffer) >= self.flush_rows or checkpoint:
+                self.__write()
+            if checkpoint:
+                self.__fsync()
+
+    def flush(self):
+        """
+        writes the buffered rows and fsyncs the file
+        """
+        with self.lock:
+            if self.file is not None:
+                self.__write()
+                self.__fsync()
+
+    def close(self):
+        self.__closed.set()
+        self.__flusher.join(1.0)  # wakes up right away, a flush in progress is short
+        with self.lock:
+            if self.file is not None:
+                self.__write()
+                self.__fsync()
+                self.file.close()
+                self.file = None
+
+    def remove(self):
+        """
+        deletes the stream, once the run has been dumped
+        """
+        self.close()
+        for suffix in (idleness_dump.STREAM_SUFFIX, idleness_dump.STREAM_META_SUFFIX):
+            try:
+                os.remove(self.basename + suffix)
+            except OSError:
+                pass
+
+    def __flush_periodically(self):
+        """
+        flushes the rows buffered by append() every 'fsync_period' seconds until the sink is closed,
+        the observations may stop arriving long before the end of the run
+        """
+        while not self.__closed.wait(self.fsync_period):
+            with self.lock:
+                stale = self.file is not None and (self.__buffer or self.__unsynced)
+            if stale:
+                self.flush()
+
+    def __write(self):
+        if self.__buffer:
+            self.file.write(''.join(self.__buffer))
+            self.file.flush()
+            self.__buffer = []
+            self.__unsynced = True
+
+    def __fsync(self):
+        os.fsync(self.file.fileno())
+        self.__latest_fsync = time.time()
+        self.__unsynced = False
@@ -0,0 +1,168 @@
+"""
+    file that holds the PathLengthMatrix class, used by topoplanner.py to estimate
+    the idleness of a destination without waiting for the global planner.
+
+    the matrix stores the length of the global plan between every pair of waypoints:
+    + entries are filled lazily: a missing entry is answered with the euclidean
+      distance (a lower bound of the plan length), flagged as an estimate, and a
+      make_plan request for it is queued to a background thread
+    + a pair without a plan is requested at most 'path_lengths_attempts' times,
+      then it keeps the euclidean estimate and is left out of the refresh
+    + when no request is pending, the background thread plans the missing entries
+      and then refreshes the oldest one every 'path_lengths_refresh' seconds
+    + the matrix is saved per environment (envs/$(env)/path_lengths.npz) when a length
+      changed, and reloaded at startup as long as the waypoints didn't change
+"""
+
+import rospy
+import time
+import numpy as np
+
+from Queue import Queue, Empty
+from threading import Thread, Lock
+from std_msgs.msg import Header
+from geometry_msgs.msg import PoseStamped
+from nav_msgs.srv import GetPlan
+from plan_utils import plan_length
+
+
+class PathLengthMatrix(object):
+    def __init__(self, destinations, filename, yaml):
+        self.yaml = yaml
+        self.filename = filename
+        self.names = [d.name for d in destinations]
+        self.ids = dict((name, i) for i, name in enumerate(self.names))
+        self.poses = [d.pose for d in destinations]
+        self.coords = np.array([(p.position.x, p.position.y) for p in self.poses], dtype=float)
+
+        n = len(self.names)
+        self.lengths = np.full((n, n), np.nan)
+        self.stamps = np.zeros((n, n))  # wall time of the latest plan of each entry
+        self.failures = np.zeros((n, n), dtype=int)  # make_plan calls that found no plan
+        np.fill_diagonal(self.lengths, 0.0)
+        np.fill_diagonal(self.stamps, np.inf)
+        self.changed = False  # lengths changed since the latest save
+
+        self.lock = Lock()
+        self.requests = Queue()
+        self.pending = set()  # (i, j) entries already queued
+        self.__proxies = {}  # robot ns -> persistent make_plan proxy
+        self.__planner_ns = None  # ns of the move_base used for the background refresh
+
+        if filename:
+            self.load()
+
+    def get(self, robot_ns, source, dest):
+        """
+        :param (str) robot_ns: ns of the robot whose move_base can plan the missing entries
+        :param (Destination) source: start of the path
+        :param (Destination) dest: end of the path
+        :return: (tuple) length of the plan, euclidean distance if not planned yet,
+            and True if the length is that euclidean estimate
+        """
+        i = self.ids[source.name]
+        j = self.ids[dest.name]
+        self.__planner_ns = robot_ns
+
+        with self.lock:
+            length = self.lengths[i, j]
+            failures = self.failures[i, j]
+        if not np.isnan(length):
+            return float(length), False
+
+        if (i, j) not in self.pending and failures < self.yaml['path_lengths_attempts']:
+            self.pending.add((i, j))
+            self.requests.put((robot_ns, i, j))
+        return float(np.hypot(*(self.coords[j] - self.coords[i]))), True
+
+    def start(self):
+        refresher = Thread(target=self.refresh)
+        refresher.daemon = True
+        refresher.start()
+
+    def refresh(self):
+        """
+        plans the requested entries first, then the missing ones and finally the oldest one
+        """
+        period = self.yaml['path_lengths_refresh']
+        try:
+            while not rospy.is_shutdown():
+                try:
+                    robot_ns, i, j = self.requests.get(timeout=period)
+                except Empty:
+                    if self.__planner_ns is None:
+                        continue
+                    robot_ns = self.__planner_ns
+                    with self.lock:
+                        i, j = np.unravel_index(np.argmin(self.stamps), self.stamps.shape)
+
+                self.plan(robot_ns, int(i), int(j))
+                self.pending.discard((i, j))
+                if self.requests.empty() and self.changed:
+                    self.save()
+        except rospy.ROSInterruptException:
+            pass
+
+    def plan(self, robot_ns, i, j):
+        service = robot_ns + self.yaml['make_plan']
+        try:
+            if robot_ns not in self.__proxies:
+                rospy.wait_for_service(service)
+                self.__proxies[robot_ns] = rospy.ServiceProxy(service, GetPlan, persistent=True)
+
+            h1 = Header(frame_id='map', stamp=rospy.Time.now())
+            h2 = Header(frame_id='map', stamp=rospy.Time.now())
+            response = self.__proxies[robot_ns](PoseStamped(h1, self.poses[i]),
+                                                PoseStamped(h2, self.poses[j]), self.yaml['ipoint_radius'])
+        except rospy.ServiceException as e:
+            print "Make_plan call failed: %s" % e
+            proxy = self.__proxies.pop(robot_ns, None)
+            if proxy is not None:
+                proxy.close()
+            return
+
+        with self.lock:
+            self.stamps[i, j] = time.time()
+            if not response.plan.poses:  # unreachable, keeps the euclidean estimate
+                self.failures[i, j] += 1
+                if np.isnan(self.lengths[i, j]) and self.failures[i, j] >= self.yaml['path_lengths_attempts']:
+                    self.stamps[i, j] = np.inf  # given up, not refreshed either
+                return
+
+            length = plan_length(response.plan)
+            self.changed |= self.lengths[i, j] != length
+            self.lengths[i, j] = length
+            if np.isnan(self.lengths[j, i]):  # plans are close to symmetric, good first guess
+                self.lengths[j, i] = length
+
+    def load(self):
+        try:
+            cache = np.load(self.filename)
+        except IOError:
+            return
+
+        try:
+            if(
+                [str(name) for name in cache['names']] == self.names and
+                np.allclose(cache['coords'], self.coords)
+            ):
+                self.lengths = cache['lengths']
+                self.stamps = cache['stamps']
+            else:
+                rospy.logwarn('Waypoints changed, %s discarded' % self.filename)
+        finally:
+            cache.close()
+
+    def save(self):
+        if not self.filename:
+            return
+
+        with self.lock:
+            lengths = self.lengths.copy()
+            stamps = self.stamps.copy()
+            self.changed = False
+        try:
+            np.savez(self.filename, names=np.array(self.names), coords=self.coords,
+                     lengths=lengths, stamps=stamps)
+        except IOError as e:
+            rospy.logwarn('Path lengths not saved: %s' % e)
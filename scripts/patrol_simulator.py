@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+
+"""
+    headless discrete-event simulator of the patrolling strategy, no Gazebo, AMCL or move_base needed.
+    NOT A NODE: run it as a plain script, for example
+        ./patrol_simulator.py --environment office --robots 5 --runs 10
+
+    it reuses:
+    + the Destination, Observation and Idleness model (destination.py), driven by a simulated clock
+    + the destination choice and availability rules of the Planner (planner_state.py)
+    + the topological routes of envs/$(env)/adjlist.txt (route_table.py)
+    + the waypoint coordinates of envs/$(env)/topomap.tpg
+    the robots travel the edges of the routes at 'robot_max_speed', slowed down by a pluggable
+    interference model. every run is written by IdlenessLogger in the usual
+    "$(env)/dumps/$(robotnum)/" layout, hence IdlenessAnalizer reads it with --maindir
+"""
+
+import argparse
+import heapq
+import itertools
+import math
+import os
+import random
+import rospy
+import yaml
+
+import destination
+from destination import Destination
+from robot import Robot
+from planner_state import PlannerState, NullLock
+from route_table import RouteTable
+from topological_map import TopologicalMap
+from idleness_analysis import IdlenessLogger
+from geometry_msgs.msg import Pose, Point, Quaternion
+
+
+PKG_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+ENVS_PATH = os.path.join(PKG_PATH, 'envs/')
+SIM_PATH = os.path.join(PKG_PATH, 'idleness_sim/')
+
+
+class SimClock(object):
+    def __init__(self):
+        self.time = 0.0  # simulated seconds
+        self.__stamp = rospy.Time.from_sec(0.0)  # the Destinations only read the Times they get
+
+    def __call__(self):
+        if self.__stamp.to_sec() != self.time:  # a new Time once per event, not once per call
+            self.__stamp = rospy.Time.from_sec(self.time)
+        return self.__stamp
+
+
+class NoInterference(object):
+    """
+    every robot travels at full speed
+    """
+    def travel_time(self, simulator, robot, edge, base_time):
+        return base_time
+
+
+class EdgeInterference(object):
+    """
+    every other robot travelling the same edge (in any direction)
+    stretches the travel time by 'slowdown' times the free travel time
+    """
+    def __init__(self, slowdown=0.5):
+        self.slowdown = slowdown
+
+    def travel_time(self, simulator, robot, edge, base_time):
+        return base_time * (1 + self.slowdown * simulator.robots_on(edge))
+
+
+INTERFERENCE_MODELS = {
+    'none': NoInterference,
+    'edge': EdgeInterference,
+}
+
+
+class PatrolSimulator(object):
+    def __init__(self, environment, robots_num, yaml, interference=None, seed=None, envs_path=ENVS_PATH):
+        self.environment = environment
+        self.yaml = yaml
+        self.interference = interference if interference is not None else NoInterference()
+        self.random = random.Random(seed)
+        random.seed(seed)  # PlannerState breaks ties with the random module
+
+        self.clock = SimClock()
+        destination.set_clock(self.clock)
+
+        env_path = os.path.join(envs_path, environment)
+        topomap = TopologicalMap(filename=os.path.join(env_path, 'topomap.tpg'))
+        self.coords = dict((n.name, (n.pose.position.x, n.pose.position.y)) for n in topomap.nodes)
+        self.routes = RouteTable(os.path.join(env_path, 'adjlist.txt'), cache=yaml['route_cache'])
+
+        destinations = []
+        for n in topomap.nodes:
+            position = n.get_position()
+            destinations.append(Destination(
+                name=n.name,
+                pose=Pose(Point(position.x, position.y, position.z), Quaternion(0, 0, 0, 1))
+            ))
+        robots = [Robot(ns='/robot_%s' % (i + 1), state='ready') for i in range(robots_num)]
+        self.state = PlannerState(destinations, robots, lock=NullLock())  # single-threaded
+
+        self.events = []  # (time, seq, action, args)
+        self.__seq = itertools.count()
+        self.edges = {}  # frozenset of the edge nodes -> robots travelling it
+        self.__routes = {}  # (source, dest) -> route and its length, the map doesn't change during a run
+        self.__lengths = {}  # (a, b) -> length of the edge
+
+    # --- event queue
+    def schedule(self, delay, action, *args):
+        heapq.heappush(self.events, (self.clock.time + delay, next(self.__seq), action, args))
+
+    def run(self, duration):
+        """
+        :param (float) duration: simulated seconds
+        """
+        names = [d.name for d in self.state.destinations]
+        starts = self.random.sample(names, len(self.state.robots)) \
+            if len(names) >= len(self.state.robots) else [self.random.choice(names) for _ in self.state.robots]
+        for robot, start in zip(self.state.robots, starts):
+            robot.afference = start
+            self.schedule(0, self.on_ready, robot)
+
+        while self.events and self.events[0][0] <= duration:
+            time, seq, action, args = heapq.heappop(self.events)
+            self.clock.time = time
+            action(*args)
+
+        self.clock.time = duration
+
+    # --- planner
+    def on_ready(self, robot):
+        robot.state = 'ready'
+        self.state.add_available(robot)
+        self.dispatch()
+
+    def dispatch(self):
+        for robot in list(self.state.available_robots.values()):
+            source = self.state.get_destination(robot.afference)
+            if not self.state.has_destination(source):
+                continue
+
+            self.state.take_available(robot)
+            dest = self.state.pick_destination(source)
+            route, path_len = self.route(source.name, dest.name)
+            if route is None:
+                self.state.release(dest)
+                self.state.put_back(robot)
+                continue
+
+            dest.estim_idl = round(path_len / self.yaml['robot_max_speed'], 2)
+            dest.path_len = round(path_len, 3)
+
+            robot.state = 'busy'
+            robot.final_goal = dest.name
+            self.state.update_goals(robot, robot.final_goal, robot.latest_goal or 'None')
+            self.state.dispatched(robot)
+            self.travel(robot, route, 1)
+
+    def route(self, source, dest):
+        """
+        :return: (tuple) nodes of the route from source to dest and its length, (None, None) if there is none
+        """
+        key = (source, dest)
+        if key not in self.__routes:
+            route = self.routes.find_path(source, dest)
+            if route is None:
+                self.__routes[key] = (None, None)
+            else:
+                self.__routes[key] = (route, sum(self.edge_length(a, b) for a, b in zip(route, route[1:])))
+        return self.__routes[key]
+
+    # --- navigation
+    def travel(self, robot, route, hop):
+        """
+        :param (list) route: nodes of the route of robot
+        :param (int) hop: index in route of the next node
+        """
+        edge = frozenset((robot.afference, route[hop]))
+        base_time = self.edge_length(robot.afference, route[hop]) / self.yaml['robot_max_speed']
+        travel_time = self.interference.travel_time(self, robot, edge, base_time)
+
+        self.edges[edge] = self.edges.get(edge, 0) + 1
+        self.schedule(travel_time, self.on_hop, robot, edge, route, hop)
+
+    def on_hop(self, robot, edge, route, hop):
+        self.edges[edge] -= 1
+        robot.afference = robot.latest_goal = route[hop]
+
+        if hop == len(route) - 1:  # final goal reached
+            robot.final_goal = None
+            self.state.update_goals(robot, 'None', robot.latest_goal)
+            self.on_ready(robot)
+        else:
+            if self.state.update_goals(robot, robot.final_goal, robot.latest_goal):
+                self.dispatch()
+            self.travel(robot, route, hop + 1)
+
+    def robots_on(self, edge):
+        return self.edges.get(edge, 0)
+
+    def edge_length(self, a, b):
+        length = self.__lengths.get((a, b))
+        if length is None:
+            (ax, ay), (bx, by) = self.coords[a], self.coords[b]
+            length = self.__lengths[(a, b)] = math.hypot(bx - ax, by - ay)
+        return length
+
+    def dump(self, path, tag):
+        for subdir in ('%s/%s/' % (self.environment, len(self.state.robots)),
+                       '%s/dumps/%s/' % (self.environment, len(self.state.robots))):
+            if not os.path.exists(path + subdir):
+                os.makedirs(path + subdir)
+
+        logger = IdlenessLogger(dest_list=self.state.destinations, environment=self.environment,
+                                robots_num=len(self.state.robots), path=path, tag=tag)
+        logger.write_statfile()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--environment', type=str, required=True)
+    parser.add_argument('--robots', type=int, nargs='+', required=True, help='Robot numbers to simulate')
+    parser.add_argument('--runs', type=int, default=1, help='Runs for each robot number')
+    parser.add_argument('--duration', type=float, help='Simulated minutes, simulation_duration if not set')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--interference', type=str, default='edge', choices=sorted(INTERFERENCE_MODELS.keys()))
+    parser.add_argument('--slowdown', type=float, default=0.5, help='Slowdown of the edge interference model')
+    parser.add_argument('--yaml', type=str, default=os.path.join(PKG_PATH, 'param/config.yaml'))
+    parser.add_argument('--maindir', type=str, default=SIM_PATH, help='Where to write the dumps')
+    args, unknown = parser.parse_known_args()
+
+    return args
+
+
+def parse_yaml(dir):
+    f = open(dir, 'r')
+    return yaml.safe_load(f)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    yaml = parse_yaml(args.yaml)
+
+    if args.duration is not None:
+        duration = 60 * args.duration
+    elif yaml['simulation_time_measure'] == 'minutes':
+        duration = 60 * yaml['simulation_duration']
+    else:
+        duration = yaml['simulation_duration']
+
+    for robots_num in args.robots:
+        for run in range(args.runs):
+            seed = args.seed + run
+            if args.interference == 'edge':
+                interference = EdgeInterference(args.slowdown)
+            else:
+                interference = INTERFERENCE_MODELS[args.interference]()
+
+            simulator = PatrolSimulator(args.environment, robots_num, yaml, interference=interference, seed=seed)
+            simulator.run(duration)
+            simulator.dump(os.path.join(args.maindir, ''), tag='sim%s' % seed)
@@ -0,0 +1,47 @@
+"""
+    helpers shared by the nodes that query the global planner (make_plan service)
+"""
+
+import rospy
+import numpy as np
+
+from std_msgs.msg import Header
+from geometry_msgs.msg import PoseStamped, Pose, Point, Quaternion
+
+
+def plan_length(plan):
+    """
+    :param plan: (nav_msgs/Path) plan returned by the make_plan service
+    :return: (float) sum of the lengths of the segments of the plan
+    """
+    if len(plan.poses) < 2:
+        return 0.0
+
+    points = np.array([(p.pose.position.x, p.pose.position.y) for p in plan.poses])
+    steps = np.diff(points, axis=0)
+
+    return float(np.sum(np.hypot(steps[:, 0], steps[:, 1])))
+
+
+def ip_posestamp(ip):
+    """
+    :param ip: (dict) interest point as published under the 'interest_points' param
+    :return: (PoseStamped) pose of the interest point in the map frame
+    """
+    position = ip['pose']['position']
+    return posestamp(position['x'], position['y'], position['z'])
+
+
+def posestamp(x, y, z=0.0):
+    """
+    :return: (PoseStamped) pose at (x, y, z) in the map frame, with no rotation
+    """
+    header = Header()
+    header.stamp = rospy.Time.now()
+    header.frame_id = 'map'
+
+    ip_pose = PoseStamped()
+    ip_pose.header = header
+    ip_pose.pose = Pose(Point(float(x), float(y), float(z)), Quaternion(0, 0, 0, 1))
+
+    return ip_pose
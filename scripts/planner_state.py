@@ -0,0 +1,285 @@
+"""
+    file that holds the PlannerState class, the indexed store of the
+    Destinations and Robots handled by topoplanner.py.
+
+    + destinations and robots are indexed by name and namespace
+    + available robots, busy robots, occupied and free destinations are sets
+    + the availability of the destinations follows the final and latest goals
+      of the robots, updated with the diff of every RobotState. a final goal
+      dropped without becoming the latest goal has been abandoned by its robot
+      (failed, timed out or preempted path) and is freed without a visit
+    + the free destinations are kept in a heap ordered by their latest visit,
+      hence the most idle free destination is an O(log n) query.
+      heap entries are invalidated lazily: every change of a destination bumps
+      its version and entries with an old version are dropped when they surface
+
+    every method is thread-safe, 'lock' can be shared with a Condition.
+    a single-threaded caller (patrol_simulator.py) can pass a NullLock instead.
+"""
+
+import heapq
+import itertools
+import random
+
+from collections import OrderedDict
+from threading import RLock
+
+
+class NullLock(object):
+    """
+    stands in for the RLock when a single thread uses the PlannerState
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class PlannerState(object):
+    def __init__(self, destinations, robots, lock=None):
+        """
+        :param lock: reentrant lock guarding the state, a new RLock if None
+        """
+        self.lock = lock if lock is not None else RLock()
+
+        self.destinations = list(destinations)
+        self.dest_by_name = dict((d.name, d) for d in self.destinations)
+        self.robots = list(robots)
+        self.robot_by_ns = dict((r.ns, r) for r in self.robots)
+
+        self.available_robots = OrderedDict()  # ns -> Robot, in the order they got ready
+        self.temp_busy = set()  # ns of the robots being dispatched
+        self.occupied = set()  # names of the destinations chosen by a robot
+        self.free = set()  # names of the available, not occupied destinations
+
+        self.goals = dict((r.ns, (None, None)) for r in self.robots)  # ns -> (final goal, latest goal)
+        self.final_refs = {}  # destination name -> ns of the robots having it as final goal
+        self.latest_refs = {}  # destination name -> ns of the robots having it as latest goal
+
+        self.__heap = []  # (latest usage, seq, version, name)
+        self.__version = dict((d.name, 0) for d in self.destinations)
+        self.__seq = itertools.count()
+
+        for d in self.destinations:
+            self.refresh(d)
+
+    def get_destination(self, name):
+        """
+        :param (str) name: name of the destination
+        :return: (Destination) object matching in name, None if there is none
+        """
+        return self.dest_by_name.get(name)
+
+    def get_robot(self, ns):
+        return self.robot_by_ns.get(ns)
+
+    # --- destinations
+    def refresh(self, dest):
+        """
+        re-indexes dest, to be called whenever its availability,
+        occupation or latest usage changes
+        """
+        with self.lock:
+            self.__version[dest.name] += 1
+            if dest.available and dest.name not in self.occupied:
+                self.free.add(dest.name)
+                heapq.heappush(self.__heap, (
+                    dest.get_latest_usage().to_sec(), next(self.__seq),
+                    self.__version[dest.name], dest.name
+                ))
+            else:
+                self.free.discard(dest.name)
+
+    def set_available(self, dest, value):
+        """
+        :return: (bool) True if the availability of dest changed
+        """
+        with self.lock:
+            changed = dest.available != value
+            dest.available = value
+            if changed:
+                self.refresh(dest)
+            return changed
+
+    def occupy(self, dest):
+        with self.lock:
+            self.occupied.add(dest.name)
+            self.refresh(dest)
+
+    def take(self, dest):
+        """
+        occupies dest only if it is still free: the ROS callbacks may have
+        occupied it, or made it unavailable, since it was listed as free
+
+        :return: (bool) True if dest has been occupied
+        """
+        with self.lock:
+            if dest.name not in self.free:
+                return False
+            self.occupy(dest)
+            return True
+
+    def release(self, dest):
+        """
+        :return: (bool) True if dest was occupied
+        """
+        with self.lock:
+            if dest.name not in self.occupied:
+                return False
+            self.occupied.discard(dest.name)
+            self.refresh(dest)
+            return True
+
+    def abandon(self, dest):
+        """
+        frees dest without registering a visit, its robot gave up on it
+
+        :return: (bool) True if dest was unavailable or occupied
+        """
+        with self.lock:
+            changed = not dest.available or dest.name in self.occupied
+            if not dest.available:
+                dest.release()
+            self.occupied.discard(dest.name)
+            self.refresh(dest)
+            return changed
+
+    def update_goals(self, robot, final_goal, latest_goal):
+        """
+        applies the change of the goals of robot to the destinations:
+        + a destination that is the final goal of a robot is not available
+        + otherwise, a destination that is the latest goal of a robot
+          is available and no longer occupied
+        + otherwise, a former final goal is released without being visited
+
+        :param (Robot) robot: robot whose RobotState has been received
+        :param (str) final_goal: name of its final goal, 'None' if it has none
+        :param (str) latest_goal: name of its latest goal, 'None' if it has none
+        :return: (bool) True if a destination got freed
+        """
+        final_goal = None if final_goal == 'None' else final_goal
+        latest_goal = None if latest_goal == 'None' else latest_goal
+
+        with self.lock:
+            old_final, old_latest = self.goals.get(robot.ns, (None, None))
+            if (old_final, old_latest) == (final_goal, latest_goal):
+                return False
+            self.goals[robot.ns] = (final_goal, latest_goal)
+
+            self.__move_ref(self.final_refs, robot.ns, old_final, final_goal)
+            self.__move_ref(self.latest_refs, robot.ns, old_latest, latest_goal)
+
+            freed = False
+            for name in set([old_final, final_goal, old_latest, latest_goal]):
+                dest = self.dest_by_name.get(name)
+                if dest is None:
+                    continue
+
+                if self.final_refs.get(name):
+                    self.set_available(dest, False)
+                elif self.latest_refs.get(name):
+                    available = self.set_available(dest, True)
+                    released = self.release(dest)
+                    freed = freed or available or released
+                elif name == old_final:
+                    freed = self.abandon(dest) or freed
+
+            return freed
+
+    @staticmethod
+    def __move_ref(refs, ns, old, new):
+        if old == new:
+            return
+        if old is not None:
+            refs[old].discard(ns)
+        if new is not None:
+            refs.setdefault(new, set()).add(ns)
+
+    def is_free(self, dest):
+        return dest.name in self.free
+
+    def free_destinations(self):
+        with self.lock:
+            return [d for d in self.destinations if d.name in self.free]
+
+    def has_destination(self, src):
+        """
+        :return: (bool) True if there is at least a free destination other than src
+        """
+        with self.lock:
+            return len(self.free) > (1 if src.name in self.free else 0)
+
+    def most_idle(self, src):
+        """
+        :param (Destination) src: destination to leave out, the afference of the robot
+        :return: (list) free destinations sharing the oldest latest usage
+        """
+        with self.lock:
+            selected = []
+            popped = []
+            oldest = None
+            while self.__heap:
+                usage, seq, version, name = self.__heap[0]
+                if version != self.__version[name]:
+                    heapq.heappop(self.__heap)  # stale entry
+                    continue
+                if oldest is not None and usage != oldest:
+                    break
+
+                popped.append(heapq.heappop(self.__heap))
+                if name != src.name:
+                    selected.append(self.dest_by_name[name])
+                    oldest = usage
+
+            for entry in popped:
+                heapq.heappush(self.__heap, entry)
+
+            return selected
+
+    def pick_destination(self, src):
+        """
+        occupies the most idle free destination, random among ties
+
+        :param (Destination) src: afference of the robot
+        :return: (Destination) chosen destination, None if there is no free destination
+        """
+        with self.lock:
+            selected = self.most_idle(src)
+            if not selected:
+                return None
+
+            dest = random.choice(selected)
+            self.occupy(dest)
+            return dest
+
+    # --- robots
+    def add_available(self, robot):
+        """
+        :return: (bool) True if robot has been added, False if it was already there or being dispatched
+        """
+        with self.lock:
+            if robot.ns in self.available_robots or robot.ns in self.temp_busy:
+                return False
+            self.available_robots[robot.ns] = robot
+            return True
+
+    def take_available(self, robot):
+        """
+        moves robot from the available robots to the ones being dispatched
+        """
+        with self.lock:
+            del self.available_robots[robot.ns]
+            self.temp_busy.add(robot.ns)
+
+    def put_back(self, robot):
+        """
+        moves a robot that couldn't be dispatched back to the available ones
+        """
+        with self.lock:
+            self.temp_busy.discard(robot.ns)
+            self.available_robots[robot.ns] = robot
+
+    def dispatched(self, robot):
+        with self.lock:
+            self.temp_busy.discard(robot.ns)
@@ -0,0 +1,74 @@
+"""
+    file that holds the PublisherRegistry class, shared by topoplanner.py,
+    toponavigator.py and the debugging nodes.
+
+    every topic gets one long-lived rospy.Publisher, registered at startup.
+    publish() never waits for subscribers: when a topic has none yet, the latest
+    message is kept for 'latch_timeout' seconds and handed to the first subscriber
+    that connects in the meantime.
+"""
+
+import rospy
+import time
+
+from threading import Lock
+
+
+class LatchListener(rospy.SubscribeListener):
+    def __init__(self, registry, topic):
+        super(LatchListener, self).__init__()
+        self.registry = registry
+        self.topic = topic
+
+    def peer_subscribe(self, topic_name, topic_publish, peer_publish):
+        self.registry.on_subscribe(self.topic, peer_publish)
+
+
+class PublisherRegistry(object):
+    def __init__(self, latch_timeout=5.0):
+        self.latch_timeout = latch_timeout
+        self.lock = Lock()
+        self.__publishers = {}  # topic -> rospy.Publisher
+        self.__pending = {}  # topic -> (msg, deadline), msgs waiting for a subscriber
+
+    def register(self, topic, msg_class, queue_size=10):
+        """
+        :return: (rospy.Publisher) the publisher of topic, created on the first call
+        """
+        with self.lock:
+            if topic not in self.__publishers:
+                self.__publishers[topic] = rospy.Publisher(
+                    topic, msg_class, queue_size=queue_size,
+                    subscriber_listener=LatchListener(self, topic)
+                )
+            return self.__publishers[topic]
+
+    def publish(self, topic, msg):
+        """
+        publishes msg on a registered topic without blocking
+        """
+        pub = self.__publishers[topic]
+        if pub.get_num_connections() > 0:
+            pub.publish(msg)
+        elif self.latch_timeout > 0:
+            with self.lock:
+                self.__pending[topic] = (msg, time.time() + self.latch_timeout)
+
+            if pub.get_num_connections() > 0:  # a subscriber connected in the meantime
+                with self.lock:
+                    pending = self.__pending.pop(topic, None)
+                if pending is not None:
+                    pub.publish(pending[0])
+
+    def connections(self, topic):
+        """
+        :return: (int) subscribers connected to a registered topic
+        """
+        return self.__publishers[topic].get_num_connections()
+
+    def on_subscribe(self, topic, peer_publish):
+        with self.lock:
+            msg, deadline = self.__pending.pop(topic, (None, 0))
+
+        if msg is not None and time.time() <= deadline:
+            peer_publish(msg)
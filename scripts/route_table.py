@@ -0,0 +1,116 @@
+"""
+    file that holds the RouteTable class, used by topoplanner.py.
+
+    the topological graph is static for the whole simulation, hence every
+    shortest route is computed once at startup and stored as a predecessor
+    matrix indexed by integer node ids:
+        pred[s, v] = id of the node that precedes v on the route s -> v
+    rebuilding a route is a walk back from the destination, O(path length).
+
+    the table can be cached next to the adjacency list (envs/$(env)/adjlist_routes.npz),
+    the cache is invalidated by the sha1 of the adjacency list.
+"""
+
+import os
+import hashlib
+import numpy as np
+import networkx as nx
+
+
+class RouteTable(object):
+    def __init__(self, adjlist, cache=True):
+        self.adjlist = adjlist
+        self.names = []  # id -> node name
+        self.ids = {}  # node name -> id
+        self.pred = None  # (n, n) predecessors, -1 if unreachable, pred[s, s] = s
+        self.hops = None  # (n, n) number of edges of each route, -1 if unreachable
+
+        digest = self.digest()
+        if not (cache and self.load_cache(digest)):
+            self.build()
+            if cache:
+                self.write_cache(digest)
+
+    def digest(self):
+        with open(self.adjlist, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def cache_path(self):
+        return os.path.splitext(self.adjlist)[0] + '_routes.npz'
+
+    def build(self):
+        graph = nx.read_adjlist(self.adjlist, delimiter=', ', nodetype=str)
+        self.names = list(graph.nodes())
+        self.ids = dict((name, i) for i, name in enumerate(self.names))
+
+        n = len(self.names)
+        dtype = np.int16 if n < np.iinfo(np.int16).max else np.int32
+        self.pred = np.full((n, n), -1, dtype=dtype)
+        self.hops = np.full((n, n), -1, dtype=dtype)
+
+        for source in self.names:
+            s = self.ids[source]
+            # same routes nx.dijkstra_path returns for every (source, dest) pair
+            for dest, path in nx.single_source_dijkstra_path(graph, source).items():
+                d = self.ids[dest]
+                self.hops[s, d] = len(path) - 1
+                self.pred[s, d] = self.ids[path[-2]] if len(path) > 1 else s
+
+    def load_cache(self, digest):
+        """
+        :return: (bool) True if a valid cache has been loaded
+        """
+        try:
+            cache = np.load(self.cache_path())
+        except IOError:
+            return False
+
+        try:
+            if str(cache['digest']) != digest:
+                return False
+
+            self.names = [str(name) for name in cache['names']]
+            self.ids = dict((name, i) for i, name in enumerate(self.names))
+            self.pred = cache['pred']
+            self.hops = cache['hops']
+        finally:
+            cache.close()
+
+        return True
+
+    def write_cache(self, digest):
+        try:
+            np.savez(self.cache_path(), digest=np.array(digest),
+                     names=np.array(self.names), pred=self.pred, hops=self.hops)
+        except IOError:
+            pass  # the cache is optional, e.g. read-only package
+
+    def route(self, source, dest):
+        """
+        :param (int) source: id of the source node
+        :param (int) dest: id of the destination node
+        :return: (list) ids of the nodes of the route, source and dest included.
+            None if dest isn't reachable from source
+        """
+        if self.hops[source, dest] < 0:
+            return None
+
+        route = [dest]
+        row = self.pred[source]
+        while route[-1] != source:
+            route.append(int(row[route[-1]]))
+        route.reverse()
+
+        return route
+
+    def find_path(self, source, dest):
+        """
+        :param (str) source: name of the source node
+        :param (str) dest: name of the destination node
+        :return: (list) names of the nodes of the route, None if there is no route
+        """
+        route = self.route(self.ids[source], self.ids[dest])
+        if route is None:
+            return None
+
+        return [self.names[i] for i in route]
@@ -0,0 +1,147 @@
+"""
+    file that holds the SpatialIndex class, a uniform grid over the waypoint coordinates
+    used by toponavigator.py, afference.py and map_editor.py.
+
+    the waypoints are bucketed in square cells, about one waypoint per cell:
+    + nearest() and ordered() visit the cells ring by ring around the query point,
+      the points of the farther rings can't be closer than the rings already visited
+    + within() visits only the cells overlapping the query circle
+    + get() finds a waypoint by name in constant time
+    the index is built once per map, an edited map needs a new index.
+"""
+
+import math
+import heapq
+import numpy as np
+
+
+class SpatialIndex(object):
+    def __init__(self, names, coords, cell=None):
+        """
+        :param (list) names: names of the waypoints
+        :param (list) coords: (x, y) of the waypoints, in the same order
+        :param (float) cell: side of the cells, sized for about one waypoint per cell if None
+        """
+        self.names = list(names)
+        self.ids = dict((name, i) for i, name in enumerate(self.names))
+        self.coords = np.array(coords, dtype=float).reshape(-1, 2)
+
+        if len(self.coords):
+            self.origin = self.coords.min(axis=0)
+            extent = self.coords.max(axis=0) - self.origin
+        else:
+            self.origin = np.zeros(2)
+            extent = np.zeros(2)
+        if cell is None:
+            if extent.min() > 0:
+                cell = math.sqrt(extent[0] * extent[1] / len(self.coords))
+            else:  # waypoints on a line or a single one
+                cell = extent.max() / max(len(self.coords), 1) or 1.0
+        self.cell = float(cell)
+
+        self.cells = {}  # (column, row) -> ids of the waypoints in the cell
+        keys = np.floor((self.coords - self.origin) / self.cell).astype(int)
+        for i, (cx, cy) in enumerate(keys):
+            self.cells.setdefault((cx, cy), []).append(i)
+        self.size = keys.max(axis=0) if len(keys) else np.zeros(2, dtype=int)  # last column and row
+
+    @classmethod
+    def from_ipoints(cls, ipoints, cell=None):
+        """
+        :param (list) ipoints: interest points as stored on the param server ('name' and 'pose' dicts)
+        """
+        return cls([ip['name'] for ip in ipoints],
+                   [(ip['pose']['position']['x'], ip['pose']['position']['y']) for ip in ipoints], cell=cell)
+
+    @classmethod
+    def from_topological_map(cls, top_map, cell=None):
+        """
+        :param (TopologicalMap) top_map: map of map_editor.py
+        """
+        return cls([n.name for n in top_map.nodes],
+                   [(n.pose.position.x, n.pose.position.y) for n in top_map.nodes], cell=cell)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get(self, name):
+        """
+        :return: (int) index of the waypoint called name, None if there is none
+        """
+        return self.ids.get(name)
+
+    def distance(self, i, x, y):
+        return math.hypot(self.coords[i, 0] - x, self.coords[i, 1] - y)
+
+    def key(self, x, y):
+        return (int(math.floor((x - self.origin[0]) / self.cell)),
+                int(math.floor((y - self.origin[1]) / self.cell)))
+
+    def ring(self, key, r):
+        """
+        :return: (list) ids of the waypoints in the cells at Chebyshev distance r from key
+        """
+        cx, cy = key
+        if r == 0:
+            return list(self.cells.get(key, ()))
+
+        ids = []
+        for dx in range(-r, r + 1):
+            for cell in ((cx + dx, cy - r), (cx + dx, cy + r)):
+                ids.extend(self.cells.get(cell, ()))
+        for dy in range(-r + 1, r):
+            for cell in ((cx - r, cy + dy), (cx + r, cy + dy)):
+                ids.extend(self.cells.get(cell, ()))
+        return ids
+
+    def ordered(self, x, y):
+        """
+        generator of the waypoints by increasing distance from (x, y), the latest waypoint first on equal
+        distance: stopping it early costs only the rings visited so far
+
+        :return: (generator) (distance, index) of the waypoints
+        """
+        if not len(self.names):
+            return
+
+        key = self.key(x, y)
+        # the rings closer than the grid are empty, the farthest one reaches its opposite corner
+        first = max(0, -key[0], -key[1], key[0] - self.size[0], key[1] - self.size[1])
+        last = max(abs(key[0]), abs(key[1]), abs(key[0] - self.size[0]), abs(key[1] - self.size[1]))
+        heap = []
+        for r in range(first, last + 1):
+            for i in self.ring(key, r):
+                heapq.heappush(heap, (self.distance(i, x, y), -i))
+
+            # the waypoints of the farther rings are at least r cells away
+            bound = r * self.cell if r < last else float('inf')
+            while heap and heap[0][0] < bound:
+                dist, neg_index = heapq.heappop(heap)
+                yield dist, -neg_index
+
+    def nearest(self, x, y, k=1):
+        """
+        :return: (list) (distance, index) of the k waypoints closest to (x, y), closest first
+        """
+        result = []
+        for item in self.ordered(x, y):
+            result.append(item)
+            if len(result) == k:
+                break
+        return result
+
+    def within(self, x, y, radius):
+        """
+        :return: (list) (distance, index) of the waypoints not farther than radius from (x, y), closest first
+        """
+        low = self.key(x - radius, y - radius)
+        high = self.key(x + radius, y + radius)
+
+        result = []
+        for cx in range(max(low[0], 0), min(high[0], self.size[0]) + 1):
+            for cy in range(max(low[1], 0), min(high[1], self.size[1]) + 1):
+                for i in self.cells.get((cx, cy), ()):
+                    dist = self.distance(i, x, y)
+                    if dist <= radius:
+                        result.append((dist, i))
+        return sorted(result, key=lambda item: (item[0], -item[1]))
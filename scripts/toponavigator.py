@@ -3,9 +3,10 @@
 """
     The Toponavigator class. Provides:
     + RobotState message updates
-    + topological localization (afference)
+    + topological localization (afference), computed by a worker thread on the latest pose only
     + topological navigation
-        --> interface to the topic where goal positions are sent.
+        --> interface to move_base, through the topic where goal positions are sent
+            or through its action server (navigation_backend.py)
         --> subscribes to the 'robot_topopath' topic (configured in config.yaml)
             to receive a RobotTopopath, which is a list of points directely passed
             to the robot metric navigator (for example, move_base)
@@ -14,16 +15,17 @@
 import rospy
 import yaml
 import math
-import numpy as np
 import argparse
 
 from robot import Robot
+from afference import AfferenceEngine
+from interest_points import InterestPoints
+from publishers import PublisherRegistry
+from navigation_backend import Hop, make_backend, REACHED, PREEMPTED
 from termcolor import colored
-from threading import Thread
+from threading import Thread, Condition, Lock
 from multirobot_interference.msg import *
-from std_msgs.msg import Header
-from nav_msgs.srv import GetPlan
-from geometry_msgs.msg import PoseStamped, PoseWithCovarianceStamped, Pose, Point, Quaternion
+from geometry_msgs.msg import PoseStamped, PoseWithCovarianceStamped
 
 
 class Toponavigator(object):
@@ -39,21 +41,38 @@ class Toponavigator(object):
         else:
             name = '/'+robot
         self.robot = Robot(ns=name, state=self.READY)
-        self.goal_reached = None
+        self.hop = None  # goal being navigated, ended by on_amcl once it is reached
+        self.ipoints = InterestPoints(yaml)  # read once, reloaded when toponodes_publisher changes them
+        self.afference_engine = AfferenceEngine(self.robot.ns, yaml, ipoints=self.ipoints)
         
-        self.state_publisher = self.movebase_goal_pub = None
+        # on_amcl leaves the latest pose here for compute_afference, older poses get overwritten
+        self.pose_cv = Condition()
+        self.latest_pose = None
+        self.afference_lock = Lock()  # robot.afference and robot.distance are updated together
+        
+        self.publishers = PublisherRegistry(yaml['latch_timeout'])
+        self.state_topic = self.robot.ns+self.yaml['robot_state']
+        self.backend = make_backend(self.robot.ns, yaml, self.publishers)
+        
+        # on_topopath leaves the latest topopath here for navigate, a newer one preempts it
+        self.path_cv = Condition()
+        self.pending_path = None
+        self.goals_lock = Lock()  # state, latest, current and final goal are updated together
         
     def start_threads(self):
         # --- subscribers
         rospy.Subscriber(self.robot.ns+self.yaml['robot_topopath'], RobotTopopath, self.on_topopath)
         rospy.Subscriber(self.robot.ns+self.yaml['pose_topic'], PoseWithCovarianceStamped, self.on_amcl)
+        self.ipoints.watch()
         
         # -- publishers
-        self.movebase_goal_pub = rospy.Publisher(self.robot.ns+self.yaml['goal_topic'], PoseStamped, queue_size=10)
-        self.state_publisher = rospy.Publisher(self.robot.ns+self.yaml['robot_state'],
-                                               RobotState, queue_size=self.yaml['robot_state_rate']*2)
+        self.publishers.register(self.state_topic, RobotState, queue_size=self.yaml['robot_state_rate']*2)
+        if self.yaml['debug_afference']:
+            self.publishers.register('/afference_debug', AfferenceDebug)
 
         Thread(target=self.publish_state).start()
+        Thread(target=self.compute_afference, name='afference_worker').start()
+        Thread(target=self.navigate, name='navigation_worker').start()
     
     def publish_state(self):
         try:
@@ -67,55 +86,112 @@ class Toponavigator(object):
                 
                 msg = RobotState()
                 msg.robot_name = self.robot.ns
-                msg.state = self.robot.state
-                msg.afference = self.robot.afference
-                msg.distance = self.robot.distance
-        
-                if self.robot.latest_goal is None:
-                    msg.latest_goal = 'None'
-                else:
-                    msg.latest_goal = self.robot.latest_goal
-        
-                if self.robot.current_goal is None:
-                    msg.current_goal = 'None'
-                else:
-                    msg.current_goal = self.robot.current_goal.name
+                with self.afference_lock:  # the latest afference, never waits for the worker
+                    msg.afference = self.robot.afference
+                    msg.distance = self.robot.distance
+                
+                # a consistent snapshot: the planner tells a reached final goal from an abandoned one
+                with self.goals_lock:
+                    msg.state = self.robot.state
                     
-                if self.robot.final_goal is None:
-                    msg.final_goal = 'None'
-                else:
-                    msg.final_goal = self.robot.final_goal.name
+                    if self.robot.latest_goal is None:
+                        msg.latest_goal = 'None'
+                    else:
+                        msg.latest_goal = self.robot.latest_goal
+            
+                    if self.robot.current_goal is None:
+                        msg.current_goal = 'None'
+                    else:
+                        msg.current_goal = self.robot.current_goal.name
+                        
+                    if self.robot.final_goal is None:
+                        msg.final_goal = 'None'
+                    else:
+                        msg.final_goal = self.robot.final_goal.name
 
-                self.state_publisher.publish(msg)
+                self.publishers.publish(self.state_topic, msg)
                 rate.sleep()
         except rospy.ROSInterruptException:
             pass
     
     def on_topopath(self, path):
-        self.robot.state = self.BUSY
-        self.robot.final_goal = path.path[-1]
-        while self.movebase_goal_pub.get_num_connections() < 1:
-            rospy.sleep(0.1)
+        """
+        hands path to navigate, preempting the path being followed
+        """
+        with self.path_cv:
+            self.pending_path = path
+            hop = self.hop
+            if hop is not None:
+                hop.finish(PREEMPTED)
+            self.path_cv.notify()
+    
+    def navigate(self):
+        """
+        worker thread: follows the topopaths handed by on_topopath
+        """
+        self.backend.start()
+        while not rospy.is_shutdown():
+            with self.path_cv:
+                while self.pending_path is None and not rospy.is_shutdown():
+                    self.path_cv.wait(0.5)  # a timeout keeps the shutdown check alive
+                path, self.pending_path = self.pending_path, None
+            if path is not None:
+                self.follow(path)
+    
+    def follow(self, path):
+        with self.goals_lock:
+            self.robot.state = self.BUSY
+            self.robot.final_goal = path.path[-1]
         
+        status = None
         for ipoint in path.path:
-            self.robot.current_goal = ipoint
-            self.goal_reached = False
+            hop = Hop(ipoint, timeout=self.yaml['navigation_timeout'], min_progress=self.yaml['navigation_progress'])
+            with self.path_cv:
+                if self.pending_path is not None:  # preempted before this hop got sent
+                    return
+                with self.goals_lock:
+                    self.robot.current_goal = ipoint
+                self.hop = hop  # a new hop, on_amcl can't end the previous one
             
-            self.movebase_goal_pub.publish(ipoint.pose)
-            while not self.goal_reached:
-                rospy.sleep(1)
+            self.backend.send(hop)
+            status = hop.wait()
+            if status != REACHED:
+                break
             
-            self.robot.latest_goal = self.robot.current_goal.name
+            with self.goals_lock:
+                self.robot.latest_goal = ipoint.name
+        
+        if status is None or status == PREEMPTED:
+            return  # shutdown, or the next path takes over the goals
+        
+        if status == REACHED:
+            self.log('%s: %s reached' % (self.robot.ns, self.robot.final_goal.name), 'green')
+        else:
+            self.backend.cancel()
+            self.log('%s: %s abandoned, %s on the way to %s' % (
+                self.robot.ns, self.robot.final_goal.name, status, self.robot.current_goal.name), 'red')
         
-        self.log('%s: %s reached' % (self.robot.ns, self.robot.final_goal.name), 'green')
-        self.robot.state = self.READY
-        self.robot.final_goal = None
+        # the planner releases an abandoned final goal without a visit and reassigns the robot
+        with self.goals_lock:
+            self.robot.state = self.READY
+            self.robot.final_goal = None
 
     def on_amcl(self, amcl_pose):
+        """
+        fast path: the goal-reached check only, the afference is left to compute_afference
+        """
         # -- distance-to-goal calc
         amcl_posit = amcl_pose.pose.pose.position
-        if self.robot.current_goal:
-            goal_posit = self.robot.current_goal.pose.pose.position
+        hop = self.hop
+        if hop is not None and not hop.done.is_set():
+            goal = hop.goal
+            goal_posit = goal.pose.pose.position
+            
+            # the intermediate hops are left within the look-ahead radius,
+            # the next goal is sent before the robot slows down on them
+            radius = self.yaml['ipoint_radius']
+            if goal is not self.robot.final_goal:
+                radius = max(radius, self.yaml['lookahead_radius'])
         
             # if amcl_pose is inside a circle built around
             # goal, goal is reached, else isn't
@@ -123,53 +199,61 @@ class Toponavigator(object):
                 amcl_posit.x - goal_posit.x,
                 amcl_posit.y - goal_posit.y
             )
-            if distance <= self.yaml['ipoint_radius']:
-                self.goal_reached = True
-            else:
-                self.goal_reached = False
+            hop.update(distance, radius)
     
-        # -- afference calc
-        pose_stamped = PoseStamped(amcl_pose.header, amcl_pose.pose.pose)
-        self.movebase_afference(amcl_pose=pose_stamped)
-
-        if self.yaml['debug_afference']:
-            movebase = self.movebase_afference(amcl_pose=pose_stamped)
-            eucl = self.eucl_afference(amcl_posit=amcl_posit)
-            self.debug_aff(amcl_posit, eucl, movebase)
+        # -- afference calc, handed to the worker
+        with self.pose_cv:
+            self.latest_pose = amcl_pose
+            self.pose_cv.notify()
+    
+    def compute_afference(self):
+        """
+        worker thread: computes the afference of the latest pose received,
+        the poses that arrived while it was busy are dropped
+        """
+        debug = self.yaml['debug_afference']
+        mode = self.yaml['afference_mode']
+        while not rospy.is_shutdown():
+            with self.pose_cv:
+                while self.latest_pose is None and not rospy.is_shutdown():
+                    self.pose_cv.wait(0.5)  # a timeout keeps the shutdown check alive
+                amcl_pose, self.latest_pose = self.latest_pose, None
+            if amcl_pose is None:
+                break
+            
+            amcl_posit = amcl_pose.pose.pose.position
+            eucl = movebase = None
+            # each sweep runs only if its afference is used, both of them once when debugging
+            if mode == "DWAPlanner" or debug:
+                pose_stamped = PoseStamped(amcl_pose.header, amcl_pose.pose.pose)
+                movebase = self.movebase_afference(amcl_pose=pose_stamped)
+            if mode == "Euclidean" or debug:
+                eucl = self.eucl_afference(amcl_posit=amcl_posit)
+            
+            if debug:
+                self.debug_aff(amcl_posit, eucl, movebase)
         
     def eucl_afference(self, amcl_posit):
-        while not rospy.has_param(self.yaml['interest_points']):
-            rospy.sleep(0.1)
-        int_points = rospy.get_param(self.yaml['interest_points'])
+        self.afference_engine.load_ipoints()  # the cache is shared with the engine, reloaded on a new version
 
         afference = None
         afference_dist = float('inf')
         ip_pos_debug = None  # debug
-        for ipoint in int_points:
-            ipoint_posit = {
-                'x': ipoint['pose']['position']['x'],
-                'y': ipoint['pose']['position']['y'],
-                'z': ipoint['pose']['position']['z'],
-            }
-            rbt_posit = {
-                'x': amcl_posit.x,
-                'y': amcl_posit.y,
-                'z': amcl_posit.z
-            }
-            e_dist = math.hypot(
-                ipoint_posit['x'] - rbt_posit['x'],
-                ipoint_posit['y'] - rbt_posit['y']
-            )
-
-            # assign minimum distance
-            if e_dist < afference_dist:
-                afference_dist = e_dist
-                afference = ipoint['name']
-                ip_pos_debug = Point(ipoint_posit['x'], ipoint_posit['y'], ipoint_posit['z'])
+        index = None
+        # on equal distance the first interest point of the param list wins, as it did with the
+        # exhaustive loop: ordered() yields the latest first, the last one yielded is kept
+        for e_dist, i in self.ipoints.index.ordered(amcl_posit.x, amcl_posit.y):
+            if e_dist > afference_dist:
+                break
+            afference_dist, index = e_dist, i
+        if index is not None:
+            afference = self.ipoints.names[index]
+            ip_pos_debug = self.ipoints.point(index)
 
         if self.yaml['afference_mode'] == "Euclidean":
-            self.robot.afference = afference
-            self.robot.distance = afference_dist
+            with self.afference_lock:
+                self.robot.afference = afference
+                self.robot.distance = afference_dist
 
         if self.yaml['debug_afference']:
             return {
@@ -180,39 +264,19 @@ class Toponavigator(object):
             }
 
     def movebase_afference(self, amcl_pose):
-        while not rospy.has_param(self.yaml['interest_points']):
-            rospy.sleep(0.1)
-        ipoints = rospy.get_param(self.yaml['interest_points'])
-    
-        afference_dist = float('inf')
-        afference = None
-        ip_pos_debug = None
-        for ip in ipoints:
-            ip_pose = self.get_ip_posestamp(ip)
-            
-            rospy.wait_for_service(self.robot.ns+self.yaml['make_plan'])
-            try:
-                make_plan = rospy.ServiceProxy(self.robot.ns+self.yaml['make_plan'], GetPlan)
-                response = make_plan(amcl_pose, ip_pose, self.yaml['ipoint_radius'])
-            
-                path_length = self.get_plan_len(response.plan)
-                if path_length <= afference_dist:
-                    afference_dist = path_length
-                    afference = ip['name']
-                    ip_pos_debug = Point(ip['pose']['position']['x'], ip['pose']['position']['y'], 0)
-            except rospy.ServiceException as e:
-                print "Make_plan call failed: %s" % e
+        result = self.afference_engine.get_afference(amcl_pose)
         
         if self.yaml['afference_mode'] == "DWAPlanner":
-            self.robot.distance = afference_dist
-            self.robot.afference = afference
+            with self.afference_lock:
+                self.robot.distance = result['dist']
+                self.robot.afference = result['afference']
         
         if self.yaml['debug_afference']:
             return {
                 'mode': 'movebase',
-                'afference': afference,
-                'ip_posit': ip_pos_debug,
-                'dist': afference_dist
+                'afference': result['afference'],
+                'ip_posit': result['ip_posit'],
+                'dist': result['dist']
             }
         
     def debug_aff(self, amcl_posit, eucl, movebase):
@@ -228,41 +292,8 @@ class Toponavigator(object):
             msg.eucl_afference = eucl['ip_posit']
             msg.mvbs_afference = movebase['ip_posit']
 
-            pub = rospy.Publisher('/afference_debug', AfferenceDebug, queue_size=10)
-            while pub.get_num_connections() < 1:
-                rospy.sleep(0.1)
-            pub.publish(msg)
+            self.publishers.publish('/afference_debug', msg)
     
-    @staticmethod
-    def get_plan_len(plan):
-        path_length = 0
-        for i in range(len(plan.poses) - 1):
-            position_a_x = plan.poses[i].pose.position.x
-            position_b_x = plan.poses[i + 1].pose.position.x
-            position_a_y = plan.poses[i].pose.position.y
-            position_b_y = plan.poses[i + 1].pose.position.y
-        
-            path_length += np.sqrt(
-                np.power((position_b_x - position_a_x), 2) + np.power((position_b_y - position_a_y), 2))
-            
-        return path_length
-    
-    @staticmethod
-    def get_ip_posestamp(ip):
-        header = Header()
-        header.stamp = rospy.Time.now()
-        header.frame_id = 'map'
-    
-        ip_x = ip['pose']['position']['x']
-        ip_y = ip['pose']['position']['y']
-        ip_z = ip['pose']['position']['z']
-    
-        ip_pose = PoseStamped()
-        ip_pose.header = header
-        ip_pose.pose = Pose(Point(ip_x, ip_y, ip_z), Quaternion(0, 0, 0, 1))
-        
-        return ip_pose
-
     def log(self, msg, color, attrs=None):
         if self.logging:
             print colored(msg, color=color, attrs=attrs)
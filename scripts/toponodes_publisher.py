@@ -3,7 +3,9 @@
 """
     Node that reads the topological map saved as *.tpg and
     publishes the list of interest_points both as parameter
-    and to the 'interest_points' topic (configured in config.yaml)
+    and to the 'interest_points' topic (configured in config.yaml).
+    once the parameter is set, its version is published (latched) on the
+    'interest_points_version' topic, the toponavigators reload their cache on a new version
 """
 
 import rospy
@@ -14,6 +16,7 @@ from std_msgs.msg import Header, String, ColorRGBA
 from geometry_msgs.msg import Pose, Vector3
 from visualization_msgs.msg import Marker, MarkerArray
 from topological_map import TopologicalMap
+from interest_points import version_of
 
 
 def node_to_marker(node, marker_id):
@@ -99,9 +102,14 @@ if __name__ == '__main__':
 
     topomap = TopologicalMap(filename=args.topomap)
     rospy.set_param(yaml['interest_points'], topomap.nodes)
+    
+    # latched, the version reaches the toponavigators started later as long as this node runs
+    version_pub = rospy.Publisher(yaml['interest_points_version'], String, queue_size=1, latch=True)
+    version_pub.publish(String(version_of(rospy.get_param(yaml['interest_points']))))
 
     try:
         marker_array = build_marker_array(topomap)
         publish_marker_array(topic=yaml['interest_points'], marker_array=marker_array)
+        rospy.spin()
     except rospy.ROSInterruptException:
         pass
@@ -5,33 +5,40 @@
 """
 
 import argparse
-import random
+import os
 import yaml
 import rospy
-import networkx as nx
 import numpy as np
 import webcolors
 
 from termcolor import colored
 from robot import Robot
-from threading import Thread
+from threading import Thread, Condition
 from geometry_msgs.msg import PoseStamped, Pose, Point, Quaternion
 from multirobot_interference.msg import *
 from destination import Destination
+from planner_state import PlannerState
+from route_table import RouteTable
+from path_lengths import PathLengthMatrix
+from assignment import assign
+from publishers import PublisherRegistry
 from idleness_analysis import IdlenessLogger
 from std_msgs.msg import Header
-from nav_msgs.srv import GetPlan
 
 
 class Planner(object):
     def __init__(self, adjlist, environment, yaml):
-        self.graph = nx.read_adjlist(adjlist, delimiter=', ', nodetype=str)
         self.yaml = yaml
         self.environment = environment  # house, office ...
         self.logging = yaml['logging']  # bool, whether to print colored logs or not
+        self.publishers = PublisherRegistry(yaml['latch_timeout'])
         
-        self.occupied_dests = []
-        self.destinations = []
+        # the history is bounded only when the stream keeps every observation, the dump reads them from it
+        history = None
+        if yaml['simulation_dump'] and yaml['observation_stream']:
+            history = yaml['observation_history'] or None
+        
+        destinations = []
         for n in rospy.get_param(yaml['interest_points']):
             d = Destination(
                 name=n['name'],
@@ -42,18 +49,29 @@ class Planner(object):
                         n['pose']['position']['z']
                     ),
                     Quaternion(0, 0, 0, 1)
-                )
+                ),
+                history=history
             )
-            self.destinations.append(d)
+            destinations.append(d)
 
-        self.robots = []
-        self.available_robots = []
-        self.temp_busy = []
+        # every route of the topological graph, computed once
+        self.routes = RouteTable(adjlist, cache=yaml['route_cache'])
+        
+        # global plan lengths between waypoints, filled in background
+        if yaml['path_lengths_cache']:
+            lengths_file = os.path.join(os.path.dirname(adjlist), 'path_lengths.npz')
+        else:
+            lengths_file = None
+        self.path_lengths = PathLengthMatrix(destinations, lengths_file, yaml)
+        
+        self.ready_since = {}  # robot ns -> time it became available
+        self.dispatch_latencies = []  # seconds from ready to topopath published
         
         while not rospy.has_param(yaml['namespaces_topic']):
             rospy.logwarn("Waiting for robot namespaces to be published as param under %s" % yaml['namespaces_topic'])
             rospy.sleep(5)
             
+        robots = []
         robot_namespaces = rospy.get_param(yaml['namespaces_topic'])
         for ns, color in robot_namespaces.items():
             rgba = color.strip("'").split(' ')
@@ -62,26 +80,45 @@ class Planner(object):
                 (rgba[0], rgba[1], rgba[2])
             )
             if ns.startswith('/'):
-                self.robots.append(Robot(ns=ns, color=_color))
+                robots.append(Robot(ns=ns, color=_color))
             else:
-                self.robots.append(Robot(ns='/' + ns, color=_color))
+                robots.append(Robot(ns='/' + ns, color=_color))
+        
+        # indexed destinations and robots, shared by the threads below
+        self.state = PlannerState(destinations, robots)
+        
+        # wakes dispatch_goals up when a robot gets ready or a destination gets freed
+        self.dispatch_cv = Condition(self.state.lock)
+        
+        # dumps the idlenesses on shutdown, streaming them to disk in the meantime
+        self.dest_logger = None
+        if yaml['simulation_dump']:
+            self.dest_logger = IdlenessLogger(dest_list=self.state.destinations,
+                                              robots_num=len(robots), environment=self.environment,
+                                              tag=yaml['dump_tag'] or None)
+            if yaml['observation_stream']:
+                self.dest_logger.open_stream(yaml['observation_flush_rows'], yaml['observation_fsync_period'])
 
         # ---------------
         self.start_threads()
         # self.update_robot_state()  # can be threaded in self.start_threads()
         
     def start_threads(self):
+        # one long-lived publisher per topic
+        for r in self.state.robots:
+            self.publishers.register(r.ns + self.yaml['robot_topopath'], RobotTopopath)
+        self.publishers.register(self.yaml['destinations_log'], DestinationDebugArray, queue_size=5)
+        
+        self.path_lengths.start()
+        
         dests_logger = Thread(target=self.destinations_log)
         dests_logger.start()
         
-        dests_state_updater = Thread(target=self.update_available_dests)
-        dests_state_updater.start()
-        
         robot_state_updater = Thread(target=self.update_robot_state)
         robot_state_updater.start()
         
     def update_robot_state(self):
-        for r in self.robots:
+        for r in self.state.robots:
             rospy.Subscriber(r.ns+self.yaml['robot_state'], RobotState, self.on_robot_state)
         
     def on_robot_state(self, msg):
@@ -95,19 +132,24 @@ class Planner(object):
             dist=msg.distance
         )
 
-        for r in self.robots:
-            if r.ns == temp.ns:
-                r.state = temp.state
-                r.current_goal = temp.current_goal
-                r.latest_goal = temp.latest_goal
-                r.final_goal = temp.final_goal
-                r.afference = temp.afference
-                r.distance = temp.distance
+        r = self.state.get_robot(temp.ns)
+        if r is not None:
+            r.state = temp.state
+            r.current_goal = temp.current_goal
+            r.latest_goal = temp.latest_goal
+            r.final_goal = temp.final_goal
+            r.afference = temp.afference
+            r.distance = temp.distance
 
-                if r.state == 'ready' and r not in self.available_robots and r not in self.temp_busy:
-                    self.available_robots.append(r)
+            with self.dispatch_cv:
+                # destinations follow the change of the final and latest goal of the robot
+                if self.state.update_goals(r, temp.final_goal, temp.latest_goal):
+                    self.dispatch_cv.notify()
+                
+                if r.state == 'ready' and self.state.add_available(r):
+                    self.ready_since[r.ns] = rospy.Time.now()
+                    self.dispatch_cv.notify()
                     self.log('%s is available' % r.ns, 'blue', attrs=['bold'])
-                break
         
     def debug(self):
         # crash test
@@ -122,7 +164,7 @@ class Planner(object):
         tp_rbt1 = self.build_topopath(path_rbt1)
         tp_rbt2 = self.build_topopath(path_rbt2)
 
-        while not self.available_robots:
+        while not self.state.available_robots:
             rospy.sleep(1)
 
         self.publish_path(tp_rbt1, '/robot_1')
@@ -137,9 +179,7 @@ class Planner(object):
         :param (str) name: name of the destination
         :return: (Destination) object matching in name
         """
-        for n in self.destinations:
-            if n.name == name:
-                return n
+        return self.state.get_destination(name)
 
     @staticmethod
     def build_ipoint_msg(node):
@@ -167,190 +207,213 @@ class Planner(object):
     
         return RobotTopopath(toponav_ipoints)
 
-    def update_available_dests(self):
-        """
-        based on the final AND latest goals of the robots
-        (contained in the RobotState msg), updates the status
-        of the destinations
-        """
-        
-        rate = rospy.Rate(5)
-        try:
-            while not rospy.is_shutdown():
-                latest_goals = []
-                final_goals = []
-                for r in self.robots:
-                    latest_goals.append(r.latest_goal)
-                    final_goals.append(r.final_goal)
-                    
-                for d in self.destinations:
-                    updated = False
-                    for f_goal in final_goals:
-                        if f_goal != 'None' and d.name == f_goal:
-                            d.available = False
-                            updated = True
-                            break
-                       
-                    if not updated:  # updated means that destination found a match in previous iteration
-                        for l_goal in latest_goals:
-                            if l_goal != 'None' and d.name == l_goal and l_goal not in final_goals:  # <-- avoids conflict
-                                d.available = True
-                                
-                                if d in self.occupied_dests:
-                                    self.occupied_dests.remove(d)
-                                break
-                    
-                rate.sleep()
-        except rospy.ROSInterruptException:
-            pass
-    
     def find_path(self, source, dest):
         """
         :param source: source of planning (type: str, indicates a WayPoint)
         :param dest: destination of planning (type: str, indicates a WayPoint)
         :return: list of WayPoints (type:str) to traverse in order to reach the goal
         """
-        try:
-            return nx.dijkstra_path(self.graph, source, dest)
-        except nx.NetworkXNoPath as e:
-            rospy.logerr(str(e))
+        path = self.routes.find_path(source, dest)
+        if path is None:
+            rospy.logerr('Node %s not reachable from %s' % (dest, source))
+        
+        return path
 
     def dispatch_goals(self):
-        robots_num = len(self.robots)
-
         try:
             while not rospy.is_shutdown():
-                if not self.available_robots:
-                    rospy.sleep(1)
+                with self.dispatch_cv:
+                    robots = self.wait_ready_robots()
+                
+                if self.yaml['dispatch_mode'] == 'batched' and len(robots) > 1:
+                    self.dispatch_batch(robots)
                 else:
-                    robot = self.available_robots.pop(0)
-                    
-                    # if another RobotState msg for the same
-                    # robot arrives, if the robot is in
-                    # this list, the new msg gets ignored
-                    self.temp_busy.append(robot)
-                    
-                    source = self._get_node_by_name(robot.afference)
-                    
-                    while not self.has_destination(source):
-                        rospy.sleep(0.1)
-                    dest = self.choose_destination(robot.ns, source)
-                    estim_idl, path_len = self.estimate_idleness(robot.ns, source, dest)
-                    dest.estim_idl = estim_idl
-                    dest.path_len = float(path_len)
-                    
-                    path = self.find_path(source=source.name, dest=dest.name)
-                    topopath = self.build_topopath(path)
-                    
-                    self.publish_path(topopath, robot.ns)
-                    self.log('%s: %s -> %s' % (robot.ns, source, dest.name), 'red')
-                    self.temp_busy.remove(robot)
+                    for robot in robots:
+                        self.dispatch(robot)
         except rospy.ROSInterruptException:
             pass
+    
+    def wait_ready_robots(self):
+        """
+        blocks on dispatch_cv (must be held) until at least one available
+        robot has a free destination. the robots that can be served are
+        moved to temp_busy: if another RobotState msg for the same
+        robot arrives while it is there, the new msg gets ignored
+        
+        :return: (list) robots to dispatch, in the order they got ready
+        """
+        while not rospy.is_shutdown():
+            ready = [
+                r for r in self.state.available_robots.values()
+                if self.has_destination(self._get_node_by_name(r.afference))
+            ]
+            if ready:
+                for robot in ready:
+                    self.state.take_available(robot)
+                return ready
+            
+            self.dispatch_cv.wait()
+        
+        return []
+    
+    def dispatch(self, robot):
+        source = self._get_node_by_name(robot.afference)
+        
+        with self.dispatch_cv:
+            dest = self.choose_destination(robot.ns, source)
+            if dest is None:  # the free destinations went to the robots served before
+                self.state.put_back(robot)
+                return
+        
+        estim_idl, path_len, path_estimated = self.estimate_idleness(robot.ns, source, dest)
+        self.send_goal(robot, source, dest, estim_idl, path_len, path_estimated)
+    
+    def dispatch_batch(self, robots):
+        """
+        assigns the free destinations to all the ready robots at once:
+        the estimates of every (robot, destination) pair come from the
+        PathLengthMatrix without waiting for the global planner, then
+        the assignment maximizes the total utility
+            true idleness - assignment_distance_weight * estimated idleness
+        instead of handing out the most idle destinations one robot at a time
+        
+        :param (list) robots: robots moved to temp_busy by wait_ready_robots
+        """
+        sources = [self._get_node_by_name(r.afference) for r in robots]
+        candidates = self.state.free_destinations()
+        
+        pairs = [
+            (i, j) for i in range(len(robots)) for j in range(len(candidates))
+            if candidates[j].name != sources[i].name
+        ]
+        estimates = [self.estimate_idleness(robots[i].ns, sources[i], candidates[j]) for i, j in pairs]
+        
+        utility = np.full((len(robots), len(candidates)), -np.inf)
+        weight = self.yaml['assignment_distance_weight']
+        for (i, j), (estim_idl, path_len, path_estimated) in zip(pairs, estimates):
+            utility[i, j] = candidates[j].get_true_idleness() - weight * estim_idl
+        estimates = dict(zip(pairs, estimates))
+        
+        assigned = set()
+        for i, j in assign(utility):
+            if not self.state.take(candidates[j]):  # taken or made unavailable in the meantime
+                continue
+            estim_idl, path_len, path_estimated = estimates[(i, j)]
+            self.send_goal(robots[i], sources[i], candidates[j], estim_idl, path_len, path_estimated)
+            assigned.add(i)
+        
+        with self.dispatch_cv:
+            for i in range(len(robots)):
+                if i not in assigned:  # more ready robots than free destinations, or lost its destination
+                    self.state.put_back(robots[i])
+    
+    def send_goal(self, robot, source, dest, estim_idl, path_len, path_estimated=False):
+        """
+        publishes the topopath from source to dest to robot, dest must already be occupied
+
+        :param (bool) path_estimated: True if path_len is the euclidean distance, not a plan length
+        """
+        dest.estim_idl = estim_idl
+        dest.path_len = float(path_len)
+        dest.path_estimated = path_estimated
+        
+        path = self.find_path(source=source.name, dest=dest.name)
+        topopath = self.build_topopath(path)
+        
+        self.publish_path(topopath, robot.ns)
+        latency = (rospy.Time.now() - self.ready_since.pop(robot.ns)).to_sec()
+        self.dispatch_latencies.append(latency)
+        self.log('%s: %s -> %s (%ss)' % (robot.ns, source, dest.name, round(latency, 3)), 'red')
+        
+        self.state.dispatched(robot)
         
     def has_destination(self, src):
         """
         returns True if there is at least a dest that
         is free, otherwise returns False
         """
-        for d in self.destinations:
-            if (
-                d.available and
-                d.name != src.name and
-                d not in self.occupied_dests
-            ):
-                return True
-        
-        return False
+        return self.state.has_destination(src)
 
     def choose_destination(self, robot_ns, src):
         """
         chooses a valid destination for the robot with
-        ns == robot_ns
+        ns == robot_ns: the free destination with the oldest
+        latest visit, hence the highest true idleness
         
         :param (str) robot_ns: ns the robot
         :param (Destination) src: afference of the robot
         :return: (Destination) end destination for the robot
         """
-        curr_idl = -1
-        selected = []
-        
-        for d in self.destinations:
-            if (
-                d.available and
-                d.name != src.name and
-                d.get_true_idleness() >= curr_idl and
-                d not in self.occupied_dests
-            ):
-                selected.append(d)
-                curr_idl = d.get_true_idleness()
-        
-        if selected:
-            dest = random.choice(selected)
-            self.occupied_dests.append(dest)
-            
-            return dest
+        return self.state.pick_destination(src)
     
     def estimate_idleness(self, robot_ns, source, dest):
         """
         provides an estimate for the idleness of dest, supposing
-        that robot_ns travels at constant maximum speed from source to dest
+        that robot_ns travels at constant maximum speed from source to dest.
+        the path length comes from the PathLengthMatrix, hence the estimate
+        never waits for the global planner
+        
+        :return: (tuple) estimated idleness, path length and True if the
+            path length is the euclidean distance, not planned yet
         """
-        make_plan_topic = robot_ns + self.yaml['make_plan']
+        path_length, path_estimated = self.path_lengths.get(robot_ns, source, dest)
+        estimate = round(path_length / self.yaml['robot_max_speed'], 2)
         
-        rospy.wait_for_service(make_plan_topic)
-        try:
-            make_plan = rospy.ServiceProxy(make_plan_topic, GetPlan)
-    
-            h1 = Header()
-            h1.frame_id = 'map'
-            h1.stamp = rospy.Time.now()
-
-            h2 = Header()
-            h2.frame_id = 'map'
-            h2.stamp = rospy.Time.now()
-            
-            response = make_plan(PoseStamped(h1, source.pose),
-                                 PoseStamped(h2, dest.pose), self.yaml['ipoint_radius'])
-
-            plan = response.plan
-            path_length = 0
-            estimate = -1.0
-            for i in range(len(plan.poses) - 1):
-                position_a_x = plan.poses[i].pose.position.x
-                position_b_x = plan.poses[i + 1].pose.position.x
-                position_a_y = plan.poses[i].pose.position.y
-                position_b_y = plan.poses[i + 1].pose.position.y
-        
-                path_length += np.sqrt(
-                    np.power((position_b_x - position_a_x), 2) + np.power((position_b_y - position_a_y), 2)
-                )
-    
-            estimate = round(path_length / self.yaml['robot_max_speed'], 2)
-            
-            return estimate, round(path_length, 3)
-        except rospy.ServiceException as e:
-            print "Make_plan call failed: %s" % e
+        return estimate, round(path_length, 3), path_estimated
         
     def destinations_log(self):
         """
-        debug function that publishes a msg containing
-        the status of the destinations
+        debug function that publishes a single msg containing
+        the status of all the destinations
+        
+        in delta mode, only the destinations whose availability changed
+        or whose idleness got reset since the previous msg are listed:
+        the idleness of the others keeps growing with the msg stamp.
+        a full msg is still sent every 'destinations_log_snapshot' seconds
+        and as soon as a new subscriber connects, a late one would
+        otherwise never learn about the destinations that don't change
         
         destinations_debugger.py subscribes to this topic
         """
-        pub = rospy.Publisher(self.yaml['destinations_log'], DestinationDebug, queue_size=30)
-        rate = rospy.Rate(1)
+        rate = rospy.Rate(self.yaml['destinations_log_rate'])
+        topic = self.yaml['destinations_log']
+        delta = self.yaml['destinations_log_delta']
+        snapshot_period = self.yaml['destinations_log_snapshot']
+        previous = {}  # name -> (available, idleness) in the previous msg
+        connections = 0  # subscribers when the previous msg was sent
+        snapshot = None  # time of the latest full msg
         
         try:
             while not rospy.is_shutdown():
-                for d in self.destinations:
-                    msg = DestinationDebug()
-                    msg.available = d.available
-                    msg.name = d.name
-                    msg.idleness = d.get_true_idleness()
+                msg = DestinationDebugArray()
+                msg.header.stamp = rospy.Time.now()
+                
+                subscribers = self.publishers.connections(topic)
+                full = (
+                    not delta or subscribers > connections or snapshot is None or
+                    (snapshot_period and (msg.header.stamp - snapshot).to_sec() >= snapshot_period)
+                )
+                connections = subscribers
+                if full:
+                    snapshot = msg.header.stamp
+                msg.delta = not full
+                
+                for d in self.state.destinations:
+                    available = d.available
+                    idleness = d.get_true_idleness()
+                    latest = previous.get(d.name)
+                    previous[d.name] = (available, idleness)
+                    if not full and latest is not None and latest[0] == available and idleness >= latest[1]:
+                        continue
                     
-                    pub.publish(msg)
+                    entry = DestinationDebug()
+                    entry.available = available
+                    entry.name = d.name
+                    entry.idleness = idleness
+                    msg.destinations.append(entry)
+                
+                if msg.destinations or full:
+                    self.publishers.publish(topic, msg)
                 rate.sleep()
         except rospy.ROSInterruptException:
             pass
@@ -359,10 +422,7 @@ class Planner(object):
         """
         publishes the topopath under the target_robot's namespace
         """
-        pub = rospy.Publisher(target_robot + self.yaml['robot_topopath'], RobotTopopath, queue_size=10)
-        while pub.get_num_connections() < 1:
-            rospy.sleep(0.1)
-        pub.publish(path)
+        self.publishers.publish(target_robot + self.yaml['robot_topopath'], path)
         
     def log(self, msg, color, attrs=None):
         """
@@ -375,13 +435,24 @@ class Planner(object):
         """
         when roscore is shutting down, dumps the registered idlenesses
         """
-        if self.yaml['simulation_dump']:
-            dest_logger = IdlenessLogger(dest_list=self.destinations,
-                                         robots_num=len(self.robots), environment=self.environment)
-            if self.yaml['simulation_confirm_gui']:
-                dest_logger.show_confirm_gui()
+        with self.dispatch_cv:
+            self.dispatch_cv.notify_all()  # lets dispatch_goals see the shutdown
+        
+        if self.dispatch_latencies:
+            rospy.loginfo('Dispatch latency (ready -> topopath): mean %ss, max %ss over %s goals' % (
+                round(np.mean(self.dispatch_latencies), 3),
+                round(np.max(self.dispatch_latencies), 3),
+                len(self.dispatch_latencies)
+            ))
+        self.path_lengths.save()
+        
+        if self.dest_logger is not None:
+            if self.yaml['simulation_confirm_gui'] and os.environ.get('DISPLAY'):
+                self.dest_logger.show_confirm_gui()
             else:
-                dest_logger.write_statfile()
+                if self.yaml['simulation_confirm_gui']:
+                    rospy.logwarn('No display, idlenesses dumped without confirmation')
+                self.dest_logger.write_in_background(self.yaml['dump_deadline'])
         else:
             rospy.logwarn('Dump file has not been saved.')
     
@@ -419,4 +490,8 @@ if __name__ == '__main__':
 
     rospy.loginfo('Simulation started')
     # planner.debug()
-    planner.dispatch_goals()
+    
+    # the dispatcher blocks on a condition variable, the main thread is kept free for the signal handlers
+    dispatcher = Thread(target=planner.dispatch_goals)
+    dispatcher.start()
+    rospy.spin()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+    compares the afference of the bounded sweep of AfferenceEngine (afference.py) with
+    the exhaustive sweep, one make_plan call per interest point.
+
+    make_plan is replaced by a fake planner: the plan stops within 'ipoint_radius' of
+    the goal, so it can be shorter than the euclidean distance, and some interest
+    points are unreachable.
+"""
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from geometry_msgs.msg import PoseStamped
+from afference import AfferenceEngine
+from interest_points import InterestPoints
+from spatial_index import SpatialIndex
+
+import numpy as np
+
+
+YAML = {
+    'make_plan': '/move_base/make_plan',
+    'afference_update_dist': 0.0,
+    'ipoint_radius': 0.5,
+    'interest_points': '/interest_points',
+    'interest_points_version': '/interest_points_version',
+}
+
+
+class FakePlanner(AfferenceEngine):
+    def __init__(self, yaml, ipoints, lengths):
+        """
+        :param (list) lengths: plan length to each interest point from the pose of the test, None if unreachable
+        """
+        AfferenceEngine.__init__(self, '', yaml, ipoints)
+        self.lengths = lengths
+
+    def load_ipoints(self):
+        pass  # loaded by the test, there is no param server
+
+    def plan_length(self, amcl_pose, index):
+        self.plan_calls += 1
+        return self.lengths[index]
+
+
+def exhaustive(lengths):
+    """
+    :return: (int, float) index and plan length of the afference, the latest index wins on equal length
+    """
+    best, best_dist = None, float('inf')
+    for index in range(len(lengths)):
+        if lengths[index] is not None and lengths[index] <= best_dist:
+            best, best_dist = index, lengths[index]
+    return best, best_dist
+
+
+class TestAfference(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(7)
+
+    def ipoints(self, n):
+        ipoints = InterestPoints(YAML)
+        ipoints.names = ['wp%d' % i for i in range(n)]
+        ipoints.ids = dict((name, i) for i, name in enumerate(ipoints.names))
+        ipoints.coords = np.array([
+            (self.random.uniform(0, 10), self.random.uniform(0, 10), 0.0) for _ in range(n)
+        ]).reshape(-1, 3)
+        ipoints.index = SpatialIndex(ipoints.names, ipoints.coords[:, :2])
+        return ipoints
+
+    def pose(self):
+        pose = PoseStamped()
+        pose.pose.position.x = self.random.uniform(0, 10)
+        pose.pose.position.y = self.random.uniform(0, 10)
+        return pose
+
+    def lengths(self, ipoints, pose, radius):
+        """
+        :return: (list) plan lengths not shorter than the euclidean distance minus radius
+        """
+        lengths = []
+        for index in range(len(ipoints)):
+            dist = ipoints.index.distance(index, pose.pose.position.x, pose.pose.position.y)
+            if self.random.random() < 0.1:
+                lengths.append(None)
+            elif self.random.random() < 0.3:
+                lengths.append(max(dist - radius, 0.0))  # straight to the edge of the goal
+            else:
+                lengths.append(max(dist - radius, 0.0) * self.random.uniform(1.0, 1.5))
+        return lengths
+
+    def test_same_as_exhaustive(self):
+        radius = YAML['ipoint_radius']
+        for _ in range(200):
+            ipoints = self.ipoints(self.random.randint(1, 40))
+            pose = self.pose()
+            lengths = self.lengths(ipoints, pose, radius)
+
+            engine = FakePlanner(YAML, ipoints, lengths)
+            result = engine.get_afference(pose)
+
+            index, dist = exhaustive(lengths)
+            if index is None:
+                self.assertIsNone(result['afference'])
+            else:
+                self.assertEqual(result['afference'], ipoints.names[index])
+                self.assertEqual(result['dist'], dist)
+            self.assertTrue(engine.plan_calls <= len(ipoints))
+
+    def test_goal_within_radius(self):
+        # the plan to the farther interest point stops within the radius, before the closer one
+        ipoints = self.ipoints(2)
+        ipoints.coords = np.array([(1.0, 0.0, 0.0), (1.2, 0.0, 0.0)])
+        ipoints.index = SpatialIndex(ipoints.names, ipoints.coords[:, :2])
+        pose = PoseStamped()
+
+        engine = FakePlanner(YAML, ipoints, [0.9, 0.7])
+        self.assertEqual(engine.get_afference(pose)['afference'], 'wp1')
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('multirobot_interference', 'test_afference', TestAfference)
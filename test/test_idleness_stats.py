@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+    checks that the visits whose path length is the euclidean estimate (path_estimated rows of
+    idleness_dump.py) are counted apart and don't shift the interference statistics of idleness_stats.py.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import numpy as np
+
+import idleness_dump
+import idleness_stats
+
+
+def table(rows):
+    """
+    :param (list) rows: (dest, true, remaining, estimated, path_len, stamp, path_estimated), grouped by dest
+    :return: (RunTable) run of two destinations
+    """
+    data = np.array([r[:-1] for r in rows], dtype=float)
+    columns = dict((c, data[:, k]) for k, c in enumerate(idleness_dump.COLUMNS[:-2]))
+    columns['first_visit'] = np.zeros(len(rows), dtype=bool)
+    columns['path_estimated'] = np.array([r[-1] for r in rows], dtype=bool)
+    return idleness_dump.RunTable(['a', 'b'], columns, environment='office', robots=2, duration=60.0)
+
+
+PLANNED = [
+    (0, 10.0, 6.0, 4.0, 8.0, 10.0, False),
+    (0, 12.0, 7.0, 5.0, 9.0, 22.0, False),
+    (1, 15.0, 9.0, 6.0, 10.0, 15.0, False),
+]
+# euclidean path lengths, the estimated idleness is too low and the interference too high
+ESTIMATED = [
+    (0, 14.0, 12.0, 1.0, 3.0, 36.0, True),
+    (1, 20.0, 14.0, 2.0, 4.0, 35.0, True),
+]
+
+
+class TestEstimatedVisits(unittest.TestCase):
+    def setUp(self):
+        self.planned = table(PLANNED)
+        self.mixed = table(sorted(PLANNED + ESTIMATED, key=lambda r: (r[0], r[5])))
+
+    def test_interference_unchanged(self):
+        planned = idleness_stats.run_stats(self.planned)
+        mixed = idleness_stats.run_stats(self.mixed)
+
+        self.assertEqual(mixed['visits'], planned['visits'])
+        self.assertAlmostEqual(mixed['avg interf'], planned['avg interf'])
+        self.assertAlmostEqual(mixed['avg idleness'], planned['avg idleness'])
+
+        planned = idleness_stats.destination_stats(self.planned)
+        mixed = idleness_stats.destination_stats(self.mixed)
+        np.testing.assert_allclose(mixed['avg interf'], planned['avg interf'])
+
+    def test_estimated_counted(self):
+        self.assertEqual(idleness_stats.run_stats(self.planned)['estimated visits'], 0)
+        self.assertEqual(idleness_stats.run_stats(self.mixed)['estimated visits'], 2)
+        self.assertEqual(idleness_stats.destination_stats(self.mixed)['estimated visits'].tolist(), [1, 1])
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('multirobot_interference', 'test_idleness_stats', TestEstimatedVisits)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+    regression test of the legacy pickled dumps (idleness_dump.py): they don't store their duration,
+    the runs lasted LEGACY_DURATION and the idleness over time (idleness_timeseries.py) has to be
+    integrated up to the end of the run, not up to the latest observation.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+PKG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(PKG_PATH, 'scripts'))
+
+import numpy as np
+
+import idleness_dump
+import idleness_timeseries
+
+
+# the latest observation of this run is 8 seconds before its end
+PICKLE = os.path.join(PKG_PATH, 'idleness/condo_floor/dumps/3/08-02@19_14-condo_floor-3bots_DUMP.txt')
+
+
+class TestLegacyDump(unittest.TestCase):
+    def setUp(self):
+        self.table = idleness_dump.read_run(PICKLE)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_duration(self):
+        self.assertTrue(self.table.stamp.max() < idleness_dump.LEGACY_DURATION - 1)
+        self.assertEqual(self.table.duration, idleness_dump.LEGACY_DURATION)
+
+    def test_last_tooth(self):
+        # every destination keeps getting idle until the end of the run
+        worst = idleness_timeseries.worst_cases(self.table)
+        for i in range(len(self.table.names)):
+            stamps = self.table.stamp[self.table.dest == i]
+            latest = stamps.max() if len(stamps) else 0.0
+            self.assertTrue(worst[i] >= idleness_dump.LEGACY_DURATION - latest - 1e-9)
+
+    def test_converted_before_version_2(self):
+        # the conversions of the version 1 stored the latest stamp as duration
+        filename = os.path.join(self.tmpdir, 'run_DUMP.npz')
+        columns = dict((c, getattr(self.table, c)) for c in idleness_dump.COLUMNS[:-2])
+        np.savez_compressed(
+            filename, names=np.array(self.table.names), version=1, environment=self.table.environment,
+            robots=self.table.robots, start=0.0, duration=float(self.table.stamp.max()), **columns
+        )
+        converted = idleness_dump.read_run(filename)
+        self.assertEqual(converted.duration, idleness_dump.LEGACY_DURATION)
+        self.assertEqual(idleness_timeseries.run_metrics(converted), idleness_timeseries.run_metrics(self.table))
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun('multirobot_interference', 'test_legacy_dump', TestLegacyDump)